@@ -0,0 +1,193 @@
+import asyncio
+import os
+import time
+from typing import Any, Dict, Optional
+
+from starlette.routing import Match
+
+# Admission control by workload class, so long report queries can't take every pooled
+# connection and leave time logging queued behind them.
+# Each request is classified by its endpoint: heavy reports (REPORT_ENDPOINTS), lightweight
+# writes (WRITE_ENDPOINTS) and interactive reads (everything else). Every class has
+# its own concurrency limit and a bounded wait queue; a request that finds the queue full, or
+# waits longer than the class timeout, is shed with 503 and a Retry-After header.
+# The limits bound how many pooled connections each class of request can hold at once, so
+# reports can't take the whole pool (pool_size 5 + max_overflow 10). They don't reserve
+# connections for writes: background work (group commit, the recompute worker) checks out
+# connections from the same pool outside any gate. ADMISSION_CONTROL=0 turns it off.
+
+ENABLED = os.environ.get("ADMISSION_CONTROL", "1") == "1"
+
+CLASSES = {
+    #           concurrent requests, max waiting, wait timeout (s), Retry-After (s)
+    "write":  {"limit": 6, "max_queue": 200, "timeout": 2.0, "retry_after": 1},
+    "read":   {"limit": 6, "max_queue": 100, "timeout": 5.0, "retry_after": 2},
+    "report": {"limit": 3, "max_queue": 20, "timeout": 15.0, "retry_after": 10},
+}
+
+REPORT_ENDPOINTS = {
+    "get_invoice_table",
+    "get_project_utilization",
+    "preview_invoice",
+    "get_total_project_spend",
+    "get_project_spend_series",
+    "get_user_timesheet",
+    "get_project_tree",
+    "generate_invoice",
+    "render_invoice_batch",
+    "run_forecast_scenarios",
+    "get_over_allocation",
+    "clone_project",
+    "close_project_period",
+    "reopen_project_period",
+    "archive_project",
+    "restore_project",
+    "run_reconciliation",
+}
+
+# Long-lived streams and the metrics/profiling endpoints are never queued. /batch isn't either:
+# each of its sub-requests goes back through this middleware and is gated on its own, so
+# holding a write slot for the whole batch would only let report sub-requests starve writes.
+EXEMPT_ENDPOINTS = {
+    "project_events",
+    "run_batch",
+    "get_admission_metrics",
+    "get_recompute_queue_metrics",
+    "get_group_commit_metrics",
+    "get_profiles",
+    "get_profile",
+}
+
+# Listed by endpoint rather than HTTP method: the total-hours and actual-spend PATCHes are reads
+# (the frontend sends one per task on page load) and must not take time logging's write slots.
+WRITE_ENDPOINTS = {
+    "login",
+    "create_user",
+    "create_project",
+    "update_project",
+    "update_project_staffing",
+    "create_project_phase",
+    "create_phase_task",
+    "update_task_assignments",
+    "log_time_entry",
+    "update_task_contributors",
+    "dynamic_staffing_adjustment",
+    "create_invoice",
+    "delete_project",
+    "render_invoice",
+}
+
+
+class _Gate:
+    def __init__(self, name: str, limit: int, max_queue: int, timeout: float, retry_after: int) -> None:
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self.slots = asyncio.Semaphore(limit)
+        self.active = 0
+        self.waiting = 0
+        self.stats = {"admitted": 0, "queued": 0, "shed_queue_full": 0, "shed_timeout": 0, "max_wait_ms": 0.0}
+
+    async def acquire(self) -> bool:
+        if self.slots.locked():
+            if self.waiting >= self.max_queue:
+                self.stats["shed_queue_full"] += 1
+                return False
+            self.stats["queued"] += 1
+        self.waiting += 1
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(self.slots.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            self.stats["shed_timeout"] += 1
+            return False
+        finally:
+            self.waiting -= 1
+            waited_ms = (time.perf_counter() - started) * 1000
+            self.stats["max_wait_ms"] = max(self.stats["max_wait_ms"], round(waited_ms, 2))
+        self.active += 1
+        self.stats["admitted"] += 1
+        return True
+
+    def release(self) -> None:
+        self.active -= 1
+        self.slots.release()
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "limit": self.limit,
+            "max_queue": self.max_queue,
+            "timeout": self.timeout,
+            "active": self.active,
+            "waiting": self.waiting,
+            **self.stats,
+        }
+
+
+_gates: Dict[str, _Gate] = {}
+
+
+def _endpoint_name(scope) -> Optional[str]:
+    for route in scope["app"].router.routes:
+        match, child_scope = route.matches(scope)
+        if match == Match.FULL:
+            return getattr(child_scope.get("endpoint"), "__name__", None)
+    return None
+
+
+def classify(scope) -> Optional[str]:
+    """Workload class for a request, or None when it bypasses admission control."""
+    if scope["method"] == "OPTIONS":
+        return None
+    name = _endpoint_name(scope)
+    if name is None or name in EXEMPT_ENDPOINTS:
+        return None  # 404/405s and exempt endpoints go straight through
+    if name in REPORT_ENDPOINTS:
+        return "report"
+    return "write" if name in WRITE_ENDPOINTS else "read"
+
+
+def start() -> None:
+    # Semaphores bind to the running loop on first use, so the gates are (re)built at startup
+    _gates.clear()
+    _gates.update({name: _Gate(name, **settings) for name, settings in CLASSES.items()})
+
+
+def metrics() -> Dict[str, Any]:
+    return {"enabled": ENABLED, "classes": {name: gate.metrics() for name, gate in _gates.items()}}
+
+
+async def _shed(gate: _Gate, send) -> None:
+    body = f'{{"detail":"Server busy ({gate.name} requests), retry in {gate.retry_after}s"}}'.encode()
+    await send({
+        "type": "http.response.start",
+        "status": 503,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(gate.retry_after).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+class AdmissionMiddleware:
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        workload = classify(scope) if scope["type"] == "http" else None
+        gate = _gates.get(workload) if workload else None
+        if gate is None:
+            await self.app(scope, receive, send)
+            return
+
+        if not await gate.acquire():
+            await _shed(gate, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            gate.release()
@@ -0,0 +1,123 @@
+from datetime import date, datetime, timedelta
+from typing import List, Dict, Any, Optional
+
+from sqlalchemy.orm import Session
+
+import models
+from utils import monday_of
+
+
+def staffing_intervals(db: Session) -> List[Dict[str, Any]]:
+    """
+    Turns every project_staffing row into a weekly-load interval over its project's span.
+    Weekly load uses the same uniform spread as get_project_utilization
+    (forecast_hours_initial / number of project weeks).
+    """
+    rows = (
+        db.query(models.ProjectStaffing, models.Projects, models.Users)
+          .join(models.Projects, models.Projects.id == models.ProjectStaffing.project_id)
+          .join(models.Users, models.Users.id == models.ProjectStaffing.user_id)
+          .all()
+    )
+
+    intervals: List[Dict[str, Any]] = []
+    for ps, proj, user in rows:
+        try:
+            w0 = monday_of(datetime.fromisoformat(str(proj.start_date)).date())
+            wN = monday_of(datetime.fromisoformat(str(proj.end_date)).date())
+        except Exception:
+            continue  # skip projects without usable dates
+        if wN < w0:
+            continue
+        num_weeks = ((wN - w0).days // 7) + 1
+        intervals.append({
+            "user_id": ps.user_id,
+            "user_name": user.name,
+            "project_id": ps.project_id,
+            "project_name": proj.name,
+            "start_week": w0,
+            "end_week": wN,  # inclusive
+            "weekly_hours": float(ps.forecast_hours_initial or 0) / num_weeks,
+        })
+    return intervals
+
+
+def sweep_over_allocation(
+    intervals: List[Dict[str, Any]],
+    threshold: float = 40.0,
+    window_start: Optional[date] = None,
+    window_end: Optional[date] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Sorted sweep line over (user, week) events: +load when an interval opens, -load the week
+    after it closes. Produces each user's load step function and keeps the steps above
+    `threshold`. O(n log n) in the number of staffing rows.
+    """
+    events = []
+    for i, iv in enumerate(intervals):
+        events.append((iv["user_id"], iv["start_week"], 1, i))
+        events.append((iv["user_id"], iv["end_week"] + timedelta(days=7), -1, i))
+    # Closings sort before openings on the same week so back-to-back intervals do not overlap.
+    events.sort(key=lambda e: (e[0], e[1], e[2]))
+
+    conflicts: Dict[int, Dict[str, Any]] = {}
+    active: Dict[int, Dict[str, Any]] = {}
+    load = 0.0
+    current_user = None
+    idx = 0
+    while idx < len(events):
+        user_id, week = events[idx][0], events[idx][1]
+        if user_id != current_user:
+            current_user, active, load = user_id, {}, 0.0
+
+        # Apply every event at this (user, week) before reading the step value.
+        while idx < len(events) and events[idx][0] == user_id and events[idx][1] == week:
+            _, _, kind, i = events[idx]
+            if kind == 1:
+                active[i] = intervals[i]
+                load += intervals[i]["weekly_hours"]
+            else:
+                active.pop(i, None)
+                load -= intervals[i]["weekly_hours"]
+            idx += 1
+
+        # The step holds until the next event for the same user.
+        if idx < len(events) and events[idx][0] == user_id:
+            next_week = events[idx][1]
+        else:
+            continue  # the last event of a user always brings the load back to 0
+
+        if load <= threshold + 1e-9 or not active:
+            continue
+
+        seg_start, seg_end = week, next_week - timedelta(days=7)
+        if window_start is not None:
+            seg_start = max(seg_start, monday_of(window_start))
+        if window_end is not None:
+            seg_end = min(seg_end, monday_of(window_end))
+        if seg_start > seg_end:
+            continue
+
+        any_iv = next(iter(active.values()))
+        user_entry = conflicts.setdefault(user_id, {
+            "user_id": user_id,
+            "user_name": any_iv["user_name"],
+            "conflicts": [],
+        })
+        user_entry["conflicts"].append({
+            "start_week": seg_start.isoformat(),
+            "end_week": seg_end.isoformat(),
+            "num_weeks": ((seg_end - seg_start).days // 7) + 1,
+            "load_hours": round(load, 2),
+            "over_by": round(load - threshold, 2),
+            "projects": [
+                {
+                    "project_id": iv["project_id"],
+                    "project_name": iv["project_name"],
+                    "weekly_hours": round(iv["weekly_hours"], 2),
+                }
+                for iv in sorted(active.values(), key=lambda v: v["project_id"])
+            ],
+        })
+
+    return sorted(conflicts.values(), key=lambda u: (u["user_name"] or "").lower())
@@ -0,0 +1,204 @@
+import json
+import os
+import shutil
+import threading
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sqlalchemy import Boolean, Float, Integer, create_engine, select, insert, union
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import models
+
+# Cold storage for finished projects.
+# archive_project() exports a project's whole subtree to zstd-compressed Parquet files under
+# archive/project_<id>/<table>.parquet (the caller then deletes the rows from MySQL).
+# For reads, open_session() loads those files into an in-memory SQLite database with the same
+# schema, so the existing report queries run unchanged against archived projects.
+
+ARCHIVE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "archive")
+BATCH_SIZE = 50_000
+MAX_OPEN_ARCHIVES = 8
+
+# Tables that make up a project's subtree, in restore (parent -> child) order.
+SUBTREE_TABLES = [
+    models.Projects,
+    models.ProjectStaffing,
+    models.ProjectPhases,
+    models.Tasks,
+    models.TaskAssignments,
+    models.TaskAssignmentRates,
+    models.TimeEntries,
+    models.Invoices,
+    models.PeriodCloses,
+    models.BillingSnapshots,
+    models.Users,  # only users referenced by the project, needed for names in reports
+]
+
+# Users stay in MySQL when a project is archived, so they are never restored.
+RESTORE_TABLES = [model for model in SUBTREE_TABLES if model is not models.Users]
+
+_lock = threading.Lock()
+_open_archives: Dict[int, Dict[str, Any]] = {}  # project_id -> {"engine", "sessionmaker", "lock"}
+
+
+def project_dir(project_id: int) -> str:
+    return os.path.join(ARCHIVE_DIR, f"project_{project_id}")
+
+
+def is_archived(project_id: int) -> bool:
+    return os.path.exists(os.path.join(project_dir(project_id), "manifest.json"))
+
+
+def _arrow_schema(model) -> pa.Schema:
+    fields = []
+    for col in model.__table__.columns:
+        if isinstance(col.type, Boolean):
+            arrow_type = pa.bool_()
+        elif isinstance(col.type, Integer):
+            arrow_type = pa.int64()
+        elif isinstance(col.type, Float):
+            arrow_type = pa.float64()
+        else:
+            arrow_type = pa.string()
+        fields.append(pa.field(col.name, arrow_type))
+    return pa.schema(fields)
+
+
+def _subtree_filters(project_id: int) -> Dict[Any, Any]:
+    phase_ids = select(models.ProjectPhases.id).where(models.ProjectPhases.project_id == project_id)
+    task_ids = select(models.Tasks.id).where(models.Tasks.phase_id.in_(phase_ids))
+    user_ids = union(
+        select(models.ProjectStaffing.user_id).where(models.ProjectStaffing.project_id == project_id),
+        select(models.TaskAssignments.user_id).where(models.TaskAssignments.task_id.in_(task_ids)),
+        select(models.TimeEntries.user_id).where(models.TimeEntries.task_id.in_(task_ids)),
+    )
+    return {
+        models.Projects: models.Projects.id == project_id,
+        models.ProjectStaffing: models.ProjectStaffing.project_id == project_id,
+        models.ProjectPhases: models.ProjectPhases.project_id == project_id,
+        models.Tasks: models.Tasks.phase_id.in_(phase_ids),
+        models.TaskAssignments: models.TaskAssignments.task_id.in_(task_ids),
+        models.TaskAssignmentRates: models.TaskAssignmentRates.task_id.in_(task_ids),
+        models.TimeEntries: models.TimeEntries.task_id.in_(task_ids),
+        models.Invoices: models.Invoices.project_id == project_id,
+        models.PeriodCloses: models.PeriodCloses.project_id == project_id,
+        models.BillingSnapshots: models.BillingSnapshots.project_id == project_id,
+        models.Users: models.Users.id.in_(user_ids),
+    }
+
+
+def archive_project(db: Session, project_id: int) -> Dict[str, Any]:
+    """
+    Writes the project's subtree to Parquet (streamed in batches) and returns the manifest.
+    Files are written to a temp directory and renamed into place, so a partial export is never
+    mistaken for an archive. Deleting the rows from MySQL is left to the caller.
+    """
+    final_dir = project_dir(project_id)
+    tmp_dir = f"{final_dir}.tmp"
+    os.makedirs(tmp_dir, exist_ok=True)
+
+    filters = _subtree_filters(project_id)
+    row_counts: Dict[str, int] = {}
+    for model in SUBTREE_TABLES:
+        schema = _arrow_schema(model)
+        columns = [model.__table__.c[name] for name in schema.names]
+        path = os.path.join(tmp_dir, f"{model.__tablename__}.parquet")
+        count = 0
+        with pq.ParquetWriter(path, schema, compression="zstd") as writer:
+            result = db.execute(select(*columns).where(filters[model]).execution_options(yield_per=BATCH_SIZE))
+            for partition in result.partitions():
+                rows = [dict(r._mapping) for r in partition]
+                writer.write_table(pa.Table.from_pylist(rows, schema=schema))
+                count += len(rows)
+        row_counts[model.__tablename__] = count
+
+    manifest = {
+        "project_id": project_id,
+        "archived_at": datetime.now().isoformat(timespec="seconds"),
+        "row_counts": row_counts,
+    }
+    with open(os.path.join(tmp_dir, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+    if os.path.exists(final_dir):
+        raise FileExistsError(f"Archive already exists for project {project_id}")
+    os.replace(tmp_dir, final_dir)
+    return manifest
+
+
+def read_manifest(project_id: int) -> Optional[Dict[str, Any]]:
+    if not is_archived(project_id):
+        return None
+    with open(os.path.join(project_dir(project_id), "manifest.json"), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def iter_rows(project_id: int, model):
+    """Yields lists of row dicts from one archived table, batch by batch."""
+    path = os.path.join(project_dir(project_id), f"{model.__tablename__}.parquet")
+    parquet_file = pq.ParquetFile(path)
+    for batch in parquet_file.iter_batches(batch_size=BATCH_SIZE):
+        yield batch.to_pylist()
+
+
+def _load_archive(project_id: int) -> Dict[str, Any]:
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    models.Base.metadata.create_all(bind=engine, tables=[m.__table__ for m in SUBTREE_TABLES])
+    with engine.begin() as conn:
+        for model in SUBTREE_TABLES:
+            for rows in iter_rows(project_id, model):
+                if rows:
+                    conn.execute(insert(model.__table__), rows)
+    return {
+        "engine": engine,
+        "sessionmaker": sessionmaker(bind=engine, autocommit=False, autoflush=False),
+        "lock": threading.Lock(),  # one in-memory connection, so archive reads are serialized
+    }
+
+
+def open_session(project_id: int):
+    """Generator dependency body: yields a read-only session over the archived project."""
+    with _lock:
+        archive = _open_archives.pop(project_id, None)
+        if archive is None:
+            archive = _load_archive(project_id)
+        _open_archives[project_id] = archive  # most recently used last
+        while len(_open_archives) > MAX_OPEN_ARCHIVES:
+            oldest_id = next(iter(_open_archives))
+            _open_archives.pop(oldest_id)["engine"].dispose()
+
+    with archive["lock"]:
+        session = archive["sessionmaker"]()
+        try:
+            yield session
+        finally:
+            session.rollback()  # archives are read-only
+            session.close()
+
+
+def forget(project_id: int) -> None:
+    with _lock:
+        archive = _open_archives.pop(project_id, None)
+    if archive is not None:
+        archive["engine"].dispose()
+
+
+def restore_project(db: Session, project_id: int) -> Dict[str, int]:
+    """Inserts the archived subtree back into MySQL with its original ids, then drops the archive."""
+    row_counts: Dict[str, int] = {}
+    for model in RESTORE_TABLES:
+        count = 0
+        for rows in iter_rows(project_id, model):
+            if rows:
+                db.execute(insert(model.__table__), rows)
+                count += len(rows)
+        row_counts[model.__tablename__] = count
+    db.commit()
+
+    forget(project_id)
+    shutil.rmtree(project_dir(project_id))
+    return row_counts
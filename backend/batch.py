@@ -0,0 +1,101 @@
+import asyncio
+import json
+from contextvars import ContextVar
+from typing import Dict, Any, List, Optional
+from urllib.parse import urlencode
+
+from sqlalchemy.orm import Session
+
+# /batch support: runs several GET sub-requests through the ASGI app in-process, so each one
+# goes through the normal routing, validation, dependencies and exception handling.
+# While current_session is set, get_db hands every sub-request the same Session, i.e. one
+# pooled connection checkout for the whole batch.
+
+MAX_SUBREQUESTS = 20
+BLOCKED_SUFFIXES = ("/events",)  # streaming endpoints never finish inside a batch
+
+current_session: ContextVar[Optional[Session]] = ContextVar("batch_session", default=None)
+
+
+def validate_path(path: str) -> Optional[str]:
+    if not path.startswith("/"):
+        return "path must start with '/'"
+    bare = path.split("?", 1)[0].rstrip("/")
+    if bare == "/batch":
+        return "nested batches are not allowed"
+    if bare.endswith(BLOCKED_SUFFIXES):
+        return "streaming endpoints cannot be batched"
+    return None
+
+
+async def dispatch(app, path: str, params: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
+    """Runs one GET through the ASGI app and captures status, headers and JSON body."""
+    raw_path, _, inline_query = path.partition("?")
+    query = "&".join(part for part in (inline_query, urlencode(params or {}, doseq=True)) if part)
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": raw_path,
+        "raw_path": raw_path.encode(),
+        "root_path": "",
+        "query_string": query.encode(),
+        "headers": [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()],
+        "client": ("batch", 0),
+        "server": ("batch", 80),
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    response: Dict[str, Any] = {"status": 500, "headers": {}, "body": b""}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+            response["headers"] = {k.decode(): v.decode() for k, v in message.get("headers", [])}
+        elif message["type"] == "http.response.body":
+            response["body"] += message.get("body", b"")
+
+    await app(scope, receive, send)
+
+    body: Any = None
+    if response["body"]:
+        try:
+            body = json.loads(response["body"])
+        except ValueError:
+            body = response["body"].decode(errors="replace")
+    kept_headers = {k: v for k, v in response["headers"].items() if k in ("etag", "cache-control", "retry-after")}
+    return {"status": response["status"], "headers": kept_headers, "body": body}
+
+
+async def run(app, requests: List[Dict[str, Any]], shared_session: Optional[Session]) -> List[Dict[str, Any]]:
+    """
+    With a shared session the sub-requests run one after another (a DB connection cannot
+    serve two statements at once). Without one they run concurrently, each on its own session.
+    A sub-request that raises gets a 500 entry; the others still run.
+    """
+    async def one(sub: Dict[str, Any]) -> Dict[str, Any]:
+        error = validate_path(sub["path"])
+        if error:
+            return {"id": sub.get("id"), "status": 400, "headers": {}, "body": {"detail": error}}
+        try:
+            result = await dispatch(app, sub["path"], sub.get("params") or {}, sub.get("headers") or {})
+        except Exception as exc:
+            # ServerErrorMiddleware re-raises after answering 500; keep it to this sub-request,
+            # and roll the shared session back so the following ones don't run on a failed transaction
+            if shared_session is not None:
+                shared_session.rollback()
+            return {"id": sub.get("id"), "status": 500, "headers": {}, "body": {"detail": f"Internal Server Error ({type(exc).__name__})"}}
+        return {"id": sub.get("id"), **result}
+
+    if shared_session is None:
+        return list(await asyncio.gather(*(one(sub) for sub in requests)))
+
+    token = current_session.set(shared_session)
+    try:
+        return [await one(sub) for sub in requests]
+    finally:
+        current_session.reset(token)
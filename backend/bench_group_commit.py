@@ -0,0 +1,95 @@
+"""
+Benchmark: per-entry commit (current log_time_entry path) vs group commit for time entries.
+
+Runs against the configured database. Entries are written for one task/user on BENCH_DATE and
+deleted again at the end.
+
+    python bench_group_commit.py --task-id 1 --user-id 2 --entries 2000 --concurrency 50
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from typing import Awaitable, Callable, Dict, Any, List
+
+import group_commit
+import models
+from database import SessionLocal
+
+BENCH_DATE = "2099-12-31"
+
+
+def _row(task_id: int, user_id: int) -> Dict[str, Any]:
+    return {"task_id": task_id, "user_id": user_id, "work_date": BENCH_DATE, "hours": 1, "is_billable": False}
+
+
+async def _single_commit(row: Dict[str, Any]) -> None:
+    # Same as the default log_time_entry path: the async endpoint commits on the event loop
+    db = SessionLocal()
+    try:
+        db.add(models.TimeEntries(**row))
+        db.commit()
+    finally:
+        db.close()
+
+
+async def _run(write: Callable[[Dict[str, Any]], Awaitable[None]], row: Dict[str, Any], entries: int, concurrency: int) -> Dict[str, float]:
+    latencies: List[float] = []
+    remaining = iter(range(entries))
+
+    async def client() -> None:
+        for _ in remaining:
+            started = time.perf_counter()
+            await write(dict(row))
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "entries_per_sec": round(entries / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 2),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 2),
+        "max_ms": round(latencies[-1] * 1000, 2),
+    }
+
+
+def _cleanup(task_id: int, user_id: int) -> None:
+    db = SessionLocal()
+    try:
+        db.query(models.TimeEntries).filter(
+            models.TimeEntries.task_id == task_id,
+            models.TimeEntries.user_id == user_id,
+            models.TimeEntries.work_date == BENCH_DATE,
+        ).delete(synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+
+async def main(args) -> None:
+    row = _row(args.task_id, args.user_id)
+    try:
+        single = await _run(_single_commit, row, args.entries, args.concurrency)
+        print("per-entry commit:", single)
+
+        group_commit.start()
+        try:
+            grouped = await _run(group_commit.submit, row, args.entries, args.concurrency)
+        finally:
+            await group_commit.stop()
+        print("group commit:    ", grouped)
+        print("group commit stats:", group_commit.metrics())
+    finally:
+        _cleanup(args.task_id, args.user_id)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--task-id", type=int, required=True)
+    parser.add_argument("--user-id", type=int, required=True)
+    parser.add_argument("--entries", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,64 @@
+"""
+Benchmark: serialization cost per 10k rows for the list endpoints.
+
+"before" is what FastAPI did for ORM instances returned without a response_model
+(jsonable_encoder over every instance, then JSONResponse); "after" is the row_json path
+(column tuples -> dicts -> FastJSONResponse). No database needed.
+
+    python bench_serialization.py --rows 10000 --repeat 5
+"""
+import argparse
+import time
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+import models
+import row_json
+
+
+def _instances(n: int):
+    return [
+        models.TimeEntries(
+            id=i, task_id=i % 500, user_id=i % 40, work_date=f"2026-01-{i % 28 + 1:02d}",
+            hours=(i % 8) + 1, is_billable=bool(i % 3),
+        )
+        for i in range(n)
+    ]
+
+
+def _rows(n: int):
+    return [(i, i % 500, i % 40, f"2026-01-{i % 28 + 1:02d}", (i % 8) + 1, bool(i % 3)) for i in range(n)]
+
+
+def _best_of(repeat: int, fn) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    instances = _instances(args.rows)
+    rows = _rows(args.rows)
+    keys = [column.name for column in models.TimeEntries.__table__.columns]
+
+    before = _best_of(args.repeat, lambda: JSONResponse(jsonable_encoder(instances)))
+    after = _best_of(args.repeat, lambda: row_json.rows_response(rows, keys))
+
+    per_10k = 10_000 / args.rows
+    print(f"encoder: {'orjson' if row_json.orjson is not None else 'json (stdlib)'}")
+    print(f"before (ORM + jsonable_encoder): {before * 1000 * per_10k:8.2f} ms per 10k rows")
+    print(f"after  (row tuples + row_json):  {after * 1000 * per_10k:8.2f} ms per 10k rows")
+    print(f"speedup: {before / after:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+from datetime import date, datetime, timedelta
+from typing import Dict, Any, List, Optional
+
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+import models
+import rate_history
+from utils import monday_of
+
+MAX_BUCKETS = {"day": 3660, "week": 530}  # ~10 years either way
+
+# Cumulative spend vs budget vs forecast, per project and per phase, on a daily or weekly axis.
+# Actual cost comes from one grouped query (cost per phase per work_date, priced like
+# get_total_project_spend); it is bucketed into a (phases x buckets) matrix with np.add.at and
+# turned into a running total with one cumsum. Planned budget spreads each task's budget evenly
+# over its start..end days, and the forecast (get_total_forecast_cost) is spread evenly over the
+# project's dates, the same even-spread assumption get_project_utilization uses.
+
+
+def _to_date(value) -> Optional[date]:
+    try:
+        return datetime.fromisoformat(str(value)).date()
+    except Exception:
+        return None
+
+
+def _spread(amounts: np.ndarray, starts: np.ndarray, ends: np.ndarray, bucket_ends: np.ndarray) -> np.ndarray:
+    """(rows x buckets) cumulative share of each amount spent evenly over [start, end] (ordinals)."""
+    days = np.maximum(ends - starts + 1, 1)
+    elapsed = np.clip(bucket_ends[None, :] - starts[:, None] + 1, 0, days[:, None])
+    return amounts[:, None] * (elapsed / days[:, None])
+
+
+def spend_series(db: Session, project: models.Projects, granularity: str = "week") -> Dict[str, Any]:
+    phases = (
+        db.query(models.ProjectPhases.id, models.ProjectPhases.phase_name)
+          .filter(models.ProjectPhases.project_id == project.id)
+          .order_by(models.ProjectPhases.start_date, models.ProjectPhases.id)
+          .all()
+    )
+    tasks = (
+        db.query(models.Tasks.phase_id, models.Tasks.budget, models.Tasks.start_date, models.Tasks.end_date)
+          .join(models.ProjectPhases, models.ProjectPhases.id == models.Tasks.phase_id)
+          .filter(models.ProjectPhases.project_id == project.id)
+          .all()
+    )
+    cost_sql = text(f"""
+        SELECT
+          t.phase_id                                             AS phase_id,
+          te.work_date                                           AS work_date,
+          SUM(COALESCE(te.hours, 0) * {rate_history.rate_expr()}) AS cost
+        FROM time_entries AS te
+        JOIN tasks AS t ON te.task_id = t.id
+        JOIN task_assignments AS ta ON ta.task_id = t.id AND ta.user_id = te.user_id
+        JOIN project_phases AS ph ON t.phase_id = ph.id
+        {rate_history.rate_join(rate_history.PROJECT_SCOPE)}
+        WHERE ph.project_id = :project_id
+        GROUP BY t.phase_id, te.work_date
+    """)
+    cost_rows = db.execute(cost_sql, {"project_id": project.id}).fetchall()
+    forecast_total = float(db.execute(text("""
+        SELECT SUM(COALESCE(hourly_rate, 0) * COALESCE(forecast_hours_initial, 0))
+        FROM project_staffing
+        WHERE project_id = :project_id
+    """), {"project_id": project.id}).scalar() or 0.0)
+
+    # Axis: project and task dates (entries only when neither is set), at most MAX_BUCKETS long.
+    # Hours logged outside it are folded into the first/last bucket, so one mistyped work_date
+    # can't stretch the matrices below.
+    entry_dates = [_to_date(r.work_date) for r in cost_rows]
+    project_start = _to_date(project.start_date)
+    project_end = _to_date(project.end_date)
+    planned_dates = [project_start, project_end] + [_to_date(t.start_date) for t in tasks] + [_to_date(t.end_date) for t in tasks]
+    span = [d for d in planned_dates if d is not None] or [d for d in entry_dates if d is not None] or [date.today()]
+    first, last = min(span), max(span)
+
+    step = 7 if granularity == "week" else 1
+    axis_start = monday_of(first) if step == 7 else first
+    num_buckets = min((last - axis_start).days // step + 1, MAX_BUCKETS[granularity])
+    bucket_starts = [axis_start + timedelta(days=step * b) for b in range(num_buckets)]
+    bucket_ends = np.array([(d + timedelta(days=step - 1)).toordinal() for d in bucket_starts], dtype=np.int64)
+
+    phase_index = {phase_id: i for i, (phase_id, _) in enumerate(phases)}
+    P = len(phases)
+
+    # Actual cost: (phases x buckets) sums, then running total along the axis
+    actual = np.zeros((P, num_buckets), dtype=np.float64)
+    rows_i, days_i, costs = [], [], []
+    for r, d in zip(cost_rows, entry_dates):
+        if d is None or r.phase_id not in phase_index:
+            continue
+        rows_i.append(phase_index[r.phase_id])
+        days_i.append((d - axis_start).days)
+        costs.append(float(r.cost or 0.0))
+    if costs:
+        cols_i = np.clip(np.array(days_i) // step, 0, num_buckets - 1)
+        np.add.at(actual, (np.array(rows_i), cols_i), np.array(costs))
+    actual_cum = np.cumsum(actual, axis=1)
+
+    # Planned budget: each task's budget spread over its own dates (a single date counts as one day)
+    planned = np.zeros((P, num_buckets), dtype=np.float64)
+    budget_by_phase = np.zeros(P, dtype=np.float64)
+    dated = [
+        (phase_index[t.phase_id], float(t.budget or 0), _to_date(t.start_date), _to_date(t.end_date))
+        for t in tasks if t.phase_id in phase_index
+    ]
+    for i, amount, _, _ in dated:
+        budget_by_phase[i] += amount
+    dated = [(i, amount, s or e, e or s) for i, amount, s, e in dated if (s or e) is not None]
+    if dated:
+        idx = np.array([i for i, _, _, _ in dated])
+        spread = _spread(
+            np.array([amount for _, amount, _, _ in dated]),
+            np.array([min(s, e).toordinal() for _, _, s, e in dated]),
+            np.array([max(s, e).toordinal() for _, _, s, e in dated]),
+            bucket_ends,
+        )
+        np.add.at(planned, idx, spread)
+
+    # Forecast: project-level only, spread over the project's dates
+    forecast_cum = None
+    if project_start and project_end:
+        forecast_cum = _spread(
+            np.array([forecast_total]),
+            np.array([project_start.toordinal()]),
+            np.array([project_end.toordinal()]),
+            bucket_ends,
+        )[0]
+
+    def series(values: np.ndarray) -> List[float]:
+        return [round(float(v), 2) for v in values]
+
+    return {
+        "project_id": project.id,
+        "granularity": granularity,
+        "axis": [d.isoformat() for d in bucket_starts],
+        "project": {
+            "budget_total": round(float(budget_by_phase.sum()), 2),
+            "forecast_total": round(forecast_total, 2),
+            "actual_cumulative": series(actual_cum.sum(axis=0)),
+            "planned_budget_cumulative": series(planned.sum(axis=0)),
+            "forecast_cumulative": series(forecast_cum) if forecast_cum is not None else None,
+        },
+        "phases": [
+            {
+                "phase_id": phase_id,
+                "phase_name": phase_name,
+                "budget_total": round(float(budget_by_phase[i]), 2),
+                "actual_cumulative": series(actual_cum[i]),
+                "planned_budget_cumulative": series(planned[i]),
+            }
+            for i, (phase_id, phase_name) in enumerate(phases)
+        ],
+    }
@@ -0,0 +1,180 @@
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import func, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+import models
+
+# Change sequence for delta sync.
+# MySQL triggers on the synced tables REPLACE a (table, row id) entry into change_log on every
+# insert/update/delete. change_log.id is AUTO_INCREMENT and REPLACE re-inserts the entry, so each
+# change gets a new, strictly higher sequence number and the log stays compacted (latest change
+# per row only). Triggers catch every write path: ORM, raw SQL, bulk INSERT ... SELECT, group commit.
+# When the triggers are first installed the existing rows are back-filled, so since=0 is a full sync.
+#
+# Sequence numbers are handed out at write time but only become visible at commit, so a reader
+# could see seq 11 while the transaction holding seq 10 is still open (restore, clone and
+# reconcile run long ones). Each page therefore stops below a watermark: the first entry written
+# at or after the start of the oldest open writing transaction (information_schema.INNODB_TRX,
+# needs the PROCESS privilege), minus SETTLE_SECONDS of slack. Any id still uncommitted was
+# allocated after that transaction started, so nothing below the watermark can appear later.
+# Triggers stamp changed_at with SYSDATE() (execution time, not statement start) for this reason.
+#
+# The triggers also stamp each entry with the project its row belongs to (PROJECT_OF), and log the
+# other tables project reads depend on (LOGGED_TABLES); versions.py derives the per-project ETag
+# versions from these entries. Only SYNCED_TABLES are served by changes_since().
+
+SETTLE_SECONDS = 2
+
+SYNCED_TABLES = {
+    "projects": models.Projects,
+    "project_phases": models.ProjectPhases,
+    "tasks": models.Tasks,
+    "task_assignments": models.TaskAssignments,
+    "project_staffing": models.ProjectStaffing,
+    "time_entries": models.TimeEntries,
+}
+
+_TASK_PROJECT = "(SELECT ph.project_id FROM tasks t JOIN project_phases ph ON ph.id = t.phase_id WHERE t.id = {row}.task_id)"
+
+# Project a logged row belongs to ({row} is NEW/OLD, or the table itself when back-filling).
+# users are stamped 0: their names appear in every project's reads.
+PROJECT_OF = {
+    "projects": "{row}.id",
+    "project_phases": "{row}.project_id",
+    "project_staffing": "{row}.project_id",
+    "tasks": "(SELECT ph.project_id FROM project_phases ph WHERE ph.id = {row}.phase_id)",
+    "task_assignments": _TASK_PROJECT,
+    "task_assignment_rates": _TASK_PROJECT,
+    "time_entries": _TASK_PROJECT,
+    "invoices": "{row}.project_id",
+    "period_closes": "{row}.project_id",
+    "billing_snapshots": "{row}.project_id",
+    "users": "0",
+}
+LOGGED_TABLES = list(PROJECT_OF)
+
+_WATERMARK_SQL = """
+    SELECT LEAST(COALESCE(MIN(trx_started), NOW()), NOW()) - INTERVAL :settle SECOND
+    FROM information_schema.INNODB_TRX
+    WHERE trx_rows_modified > 0
+"""
+
+_EVENTS = {"ai": ("INSERT", "NEW", "upsert"), "au": ("UPDATE", "NEW", "upsert"), "ad": ("DELETE", "OLD", "delete")}
+
+
+def install_triggers(engine: Engine) -> None:
+    """Creates any missing change_log triggers (MySQL only) and back-fills newly covered tables."""
+    if engine.dialect.name != "mysql":
+        return
+    with engine.begin() as conn:
+        columns = {
+            name for (name,) in conn.execute(text(
+                "SELECT COLUMN_NAME FROM information_schema.COLUMNS"
+                " WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'change_log'"
+            ))
+        }
+        if "project_id" not in columns:  # change_log created before entries carried their project
+            conn.exec_driver_sql(
+                "ALTER TABLE change_log ADD COLUMN project_id INTEGER NULL,"
+                " ADD INDEX ix_change_log_project (project_id, id)"
+            )
+        existing = {
+            name for (name,) in conn.execute(text(
+                "SELECT TRIGGER_NAME FROM information_schema.TRIGGERS WHERE TRIGGER_SCHEMA = DATABASE()"
+            ))
+        }
+        for table in LOGGED_TABLES:
+            created = False
+            for suffix, (event, row, op) in _EVENTS.items():
+                name = f"trg_{table}_{suffix}_log"
+                if name in existing:
+                    continue
+                conn.exec_driver_sql(f"""
+                    CREATE TRIGGER {name} AFTER {event} ON {table} FOR EACH ROW
+                    REPLACE INTO change_log (table_name, row_id, op, changed_at, project_id)
+                    VALUES ('{table}', {row}.id, '{op}', SYSDATE(), {PROJECT_OF[table].format(row=row)})
+                """)
+                created = True
+                # earlier versions: NOW() stamps (_changes), then no project (_seq)
+                for legacy in (f"trg_{table}_{suffix}_changes", f"trg_{table}_{suffix}_seq"):
+                    if legacy in existing:
+                        conn.exec_driver_sql(f"DROP TRIGGER {legacy}")
+            if created:
+                project = PROJECT_OF[table].format(row=table)
+                conn.exec_driver_sql(f"""
+                    INSERT IGNORE INTO change_log (table_name, row_id, op, changed_at, project_id)
+                    SELECT '{table}', id, 'upsert', SYSDATE(), {project} FROM {table}
+                """)
+                conn.exec_driver_sql(f"""
+                    UPDATE change_log c JOIN {table} ON {table}.id = c.row_id
+                    SET c.project_id = {project}
+                    WHERE c.table_name = '{table}' AND c.project_id IS NULL
+                """)
+
+
+def current_seq(db: Session) -> int:
+    return db.execute(text("SELECT COALESCE(MAX(id), 0) FROM change_log")).scalar()
+
+
+def changes_since(db: Session, since: int, limit: int, tables: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    One page of changes after sequence `since`, oldest first, with the current row for upserts.
+    One query for the page plus one IN query per table present in it.
+    """
+    # Watermark first, on its own connection, then a fresh read view for the page itself
+    with db.get_bind().engine.connect() as conn:  # .engine: the session may be bound to a Connection
+        cutoff = str(conn.execute(text(_WATERMARK_SQL), {"settle": SETTLE_SECONDS}).scalar())  # changed_at is a string column
+    db.rollback()
+
+    log = db.query(models.ChangeLog).filter(
+        models.ChangeLog.id > since,
+        models.ChangeLog.table_name.in_(list(SYNCED_TABLES)),
+    )
+    first_unsafe = (
+        db.query(func.min(models.ChangeLog.id))
+          .filter(models.ChangeLog.id > since, models.ChangeLog.changed_at >= cutoff)
+          .scalar()
+    )
+    if first_unsafe is not None:
+        log = log.filter(models.ChangeLog.id < first_unsafe)
+    if tables:
+        log = log.filter(models.ChangeLog.table_name.in_(tables))
+    entries = log.order_by(models.ChangeLog.id).limit(limit + 1).all()
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+
+    ids_by_table: Dict[str, List[int]] = {}
+    for entry in entries:
+        if entry.op == "upsert":
+            ids_by_table.setdefault(entry.table_name, []).append(entry.row_id)
+
+    rows: Dict[tuple, Dict[str, Any]] = {}
+    for table_name, ids in ids_by_table.items():
+        model = SYNCED_TABLES[table_name]
+        columns = list(model.__table__.columns)
+        keys = [column.name for column in columns]
+        for row in db.query(*columns).filter(model.id.in_(ids)).all():
+            record = dict(zip(keys, row))
+            rows[(table_name, record["id"])] = record
+
+    changes = []
+    for entry in entries:
+        row = rows.get((entry.table_name, entry.row_id)) if entry.op == "upsert" else None
+        changes.append({
+            "seq": entry.id,
+            "table": entry.table_name,
+            "id": entry.row_id,
+            # row already gone: it was deleted concurrently and its delete follows with a later seq
+            "op": entry.op if entry.op == "delete" or row is not None else "delete",
+            "changed_at": entry.changed_at,
+            "row": row,
+        })
+
+    return {
+        "since": since,
+        "next_since": entries[-1].id if entries else since,
+        "has_more": has_more,
+        "changes": changes,
+    }
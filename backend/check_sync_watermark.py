@@ -0,0 +1,98 @@
+"""
+Delta sync check: two interleaved write transactions must never let a client skip a change.
+
+Runs against the configured MySQL database (triggers installed, PROCESS privilege granted).
+Transaction A writes first and stays open; transaction B writes later and commits. A reader
+polling /sync/changes in between must not move next_since past A's uncommitted entry; once A
+commits, continuing from that next_since must return both changes. The two test projects are
+deleted again at the end.
+
+    python check_sync_watermark.py
+"""
+import sys
+import time
+
+from sqlalchemy import text
+
+import changes
+import models
+from database import engine, SessionLocal
+
+MARKER = "__sync_watermark_check__"
+
+
+def _insert_project(conn, label: str) -> int:
+    return conn.execute(
+        text("INSERT INTO projects (name, client_name, started) VALUES (:name, :client, 0)"),
+        {"name": f"{MARKER}{label}", "client": MARKER},
+    ).lastrowid
+
+
+def _read_all(since: int):
+    """Pages through the change feed like a client would."""
+    db = SessionLocal()
+    try:
+        seen = []
+        while True:
+            page = changes.changes_since(db, since, 500, ["projects"])
+            seen += [(c["id"], c["seq"]) for c in page["changes"]]
+            since = page["next_since"]
+            if not page["has_more"]:
+                return seen, since
+    finally:
+        db.close()
+
+
+def main() -> int:
+    changes.install_triggers(engine)
+    db = SessionLocal()
+    try:
+        start = changes.current_seq(db)
+    finally:
+        db.close()
+
+    conn_a, conn_b = engine.connect(), engine.connect()
+    tx_a = conn_a.begin()
+    project_a = _insert_project(conn_a, "A")        # lower seq, stays uncommitted for now
+    time.sleep(changes.SETTLE_SECONDS + 1)
+    with conn_b.begin():
+        project_b = _insert_project(conn_b, "B")    # higher seq, committed
+    time.sleep(changes.SETTLE_SECONDS + 1)          # B is well past the settle window
+
+    failures = []
+    try:
+        seen, since = _read_all(start)
+        ids = [row_id for row_id, _ in seen]
+        if project_a in ids:
+            failures.append("uncommitted change from A was returned")
+        if project_b in ids:
+            failures.append("B was returned while A (lower seq) was still open: next_since would skip A")
+
+        tx_a.commit()
+        time.sleep(changes.SETTLE_SECONDS + 1)
+        seen, _ = _read_all(since)
+        ids = [row_id for row_id, _ in seen]
+        for label, project_id in (("A", project_a), ("B", project_b)):
+            if project_id not in ids:
+                failures.append(f"{label} missing after A committed")
+    finally:
+        if tx_a.is_active:
+            tx_a.rollback()
+        conn_a.close()
+        conn_b.close()
+        cleanup = SessionLocal()
+        try:
+            cleanup.query(models.Projects).filter(models.Projects.client_name == MARKER).delete(synchronize_session=False)
+            cleanup.commit()
+        finally:
+            cleanup.close()
+
+    for failure in failures:
+        print("FAIL:", failure)
+    if not failures:
+        print("OK: interleaved transactions were delivered without gaps")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,60 @@
+import asyncio
+import itertools
+import json
+import threading
+from typing import Dict, Any, Set, Tuple
+
+# In-process, per-project change feed used by the SSE endpoint.
+# Write paths call publish(); every open /projects/{id}/events stream gets the event.
+# Sync (def) endpoints run in the threadpool, so delivery always goes through
+# loop.call_soon_threadsafe to land on the subscriber's event loop.
+
+SUBSCRIBER_QUEUE_SIZE = 256
+
+_lock = threading.Lock()
+_subscribers: Dict[int, Set[Tuple[asyncio.AbstractEventLoop, asyncio.Queue]]] = {}
+_sequence = itertools.count(1)
+
+
+def subscribe(project_id: int) -> Tuple[asyncio.AbstractEventLoop, asyncio.Queue]:
+    sub = (asyncio.get_running_loop(), asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE))
+    with _lock:
+        _subscribers.setdefault(project_id, set()).add(sub)
+    return sub
+
+
+def unsubscribe(project_id: int, sub: Tuple[asyncio.AbstractEventLoop, asyncio.Queue]) -> None:
+    with _lock:
+        subs = _subscribers.get(project_id)
+        if subs is not None:
+            subs.discard(sub)
+            if not subs:
+                _subscribers.pop(project_id, None)
+
+
+def _deliver(queue: asyncio.Queue, event: Dict[str, Any]) -> None:
+    # A slow client drops its oldest event instead of blocking writers.
+    if queue.full():
+        try:
+            queue.get_nowait()
+        except asyncio.QueueEmpty:
+            pass
+    queue.put_nowait(event)
+
+
+def publish(project_id: int, event_type: str, data: Dict[str, Any]) -> None:
+    """Pushes a compact change event to every subscriber of the project. Safe from any thread."""
+    with _lock:
+        subs = list(_subscribers.get(project_id, ()))
+    if not subs:
+        return
+    event = {"id": next(_sequence), "type": event_type, "data": {"project_id": project_id, **data}}
+    for loop, queue in subs:
+        try:
+            loop.call_soon_threadsafe(_deliver, queue, event)
+        except RuntimeError:
+            pass  # loop already closed, subscriber is going away
+
+
+def format_sse(event: Dict[str, Any]) -> str:
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event['data'])}\n\n"
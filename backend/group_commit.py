@@ -0,0 +1,141 @@
+import asyncio
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import insert
+
+import models
+from database import SessionLocal
+
+# Optional group commit for time entries (TIME_ENTRY_GROUP_COMMIT=1).
+# Instead of one INSERT + COMMIT per logged entry, submit() queues the row and a single flusher
+# task writes everything queued as one multi-row INSERT and one COMMIT, either FLUSH_INTERVAL
+# seconds after the first row of a batch arrived or as soon as MAX_BATCH_ROWS are waiting.
+# submit() only returns once that COMMIT has succeeded, so a request is never acknowledged
+# before its row is durable.
+
+ENABLED = os.environ.get("TIME_ENTRY_GROUP_COMMIT", "0") == "1"
+FLUSH_INTERVAL = 0.005
+MAX_BATCH_ROWS = 500
+
+_queue: List[Tuple[Dict[str, Any], asyncio.Future]] = []
+_wakeup: Optional[asyncio.Event] = None
+_full: Optional[asyncio.Event] = None
+_worker: Optional[asyncio.Task] = None
+_stopping = False
+
+_metrics = {
+    "rows": 0,
+    "batches": 0,
+    "failed_rows": 0,
+    "largest_batch": 0,
+    "last_flush_ms": 0.0,
+}
+
+
+def _insert_rows(rows: List[Dict[str, Any]]) -> List[Optional[Exception]]:
+    """One multi-row INSERT and COMMIT. If the batch fails, rows are retried one by one so a bad
+    row only fails its own request. Returns one error (or None) per row."""
+    db = SessionLocal()
+    try:
+        try:
+            db.execute(insert(models.TimeEntries.__table__), rows)
+            db.commit()
+            return [None] * len(rows)
+        except Exception:
+            db.rollback()
+        errors: List[Optional[Exception]] = []
+        for row in rows:
+            try:
+                db.execute(insert(models.TimeEntries.__table__), [row])
+                db.commit()
+                errors.append(None)
+            except Exception as exc:
+                db.rollback()
+                errors.append(exc)
+        return errors
+    finally:
+        db.close()
+
+
+async def submit(row: Dict[str, Any]) -> None:
+    """Queues one time entry and waits until the batch containing it is committed."""
+    if _worker is None or _stopping:
+        raise RuntimeError("group commit is not running")
+    future = asyncio.get_running_loop().create_future()
+    _queue.append((row, future))
+    _wakeup.set()
+    if len(_queue) >= MAX_BATCH_ROWS:
+        _full.set()
+    await future
+
+
+async def _run() -> None:
+    while True:
+        await _wakeup.wait()
+        if not _stopping:
+            try:
+                await asyncio.wait_for(_full.wait(), timeout=FLUSH_INTERVAL)  # let the batch fill up
+            except asyncio.TimeoutError:
+                pass
+        _wakeup.clear()
+        _full.clear()
+
+        batch = _queue[:MAX_BATCH_ROWS]
+        del _queue[:MAX_BATCH_ROWS]
+        if _queue:
+            _wakeup.set()  # leftovers go out in the next round
+        if batch:
+            await _flush(batch)
+        if _stopping and not _queue:
+            return
+
+
+async def _flush(batch: List[Tuple[Dict[str, Any], asyncio.Future]]) -> None:
+    started = time.perf_counter()
+    try:
+        errors = await asyncio.to_thread(_insert_rows, [row for row, _ in batch])
+    except Exception as exc:
+        errors = [exc] * len(batch)
+    for (_, future), error in zip(batch, errors):
+        if future.done():
+            continue  # the request went away
+        if error is None:
+            future.set_result(None)
+        else:
+            future.set_exception(error)
+
+    _metrics["rows"] += len(batch)
+    _metrics["batches"] += 1
+    _metrics["failed_rows"] += sum(1 for error in errors if error is not None)
+    _metrics["largest_batch"] = max(_metrics["largest_batch"], len(batch))
+    _metrics["last_flush_ms"] = round((time.perf_counter() - started) * 1000, 2)
+
+
+def metrics() -> Dict[str, Any]:
+    return {
+        "enabled": _worker is not None,
+        **_metrics,
+        "avg_batch_rows": round(_metrics["rows"] / _metrics["batches"], 2) if _metrics["batches"] else 0.0,
+        "queued": len(_queue),
+    }
+
+
+def start() -> None:
+    global _wakeup, _full, _worker, _stopping
+    _stopping = False
+    _wakeup = asyncio.Event()
+    _full = asyncio.Event()
+    _worker = asyncio.get_running_loop().create_task(_run())
+
+
+async def stop() -> None:
+    """Flushes whatever is still queued, then stops the flusher."""
+    global _worker, _stopping
+    if _worker is None:
+        return
+    _stopping = True
+    _wakeup.set()
+    await _worker
+    _worker = None
@@ -0,0 +1,196 @@
+import csv
+import glob
+import hashlib
+import json
+import os
+import threading
+import uuid
+from concurrent.futures import ProcessPoolExecutor, Future
+from typing import Dict, Any, Optional
+from xml.sax.saxutils import escape
+
+# Invoice document rendering (CSV / XLSX / PDF).
+# Data is loaded in the API process and handed to a process pool as plain dicts,
+# so rendering never blocks API workers. Rendered files are cached on local disk keyed by
+# invoice id and a digest of the document data: rendered_invoices/<invoice_id>.<digest>.<format>
+# Any change to the invoice or its time entries changes the digest, so a stale file is never
+# served; the worker removes the invoice's older files when it writes a new one.
+
+RENDER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "rendered_invoices")
+FORMATS = ("csv", "xlsx", "pdf")
+MAX_WORKERS = max((os.cpu_count() or 2) - 1, 1)
+MAX_JOBS = 1000  # finished jobs beyond this are forgotten, oldest first
+
+COLUMNS = [
+    ("task", "Task"),
+    ("phase", "Phase"),
+    ("task_contributor", "Contributor"),
+    ("hours", "Hours"),
+    ("rate", "Rate"),
+    ("amount", "Amount"),
+]
+
+_executor: Optional[ProcessPoolExecutor] = None
+_jobs_lock = threading.Lock()
+_jobs: Dict[str, Dict[str, Any]] = {}
+
+
+def document_digest(document: Dict[str, Any]) -> str:
+    payload = json.dumps(document, sort_keys=True, default=str).encode()
+    return hashlib.blake2b(payload, digest_size=8).hexdigest()
+
+
+def document_path(document: Dict[str, Any], fmt: str) -> str:
+    return os.path.join(RENDER_DIR, f"{document['id']}.{document_digest(document)}.{fmt}")
+
+
+# --- renderers (run inside the worker processes) ---
+
+def _render_csv(document: Dict[str, Any], path: str) -> None:
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Invoice", document["id"]])
+        writer.writerow(["Client", document["client_name"]])
+        writer.writerow(["Period", document["period_start"], document["period_end"]])
+        writer.writerow([])
+        writer.writerow([label for _, label in COLUMNS])
+        for row in document["rows"]:
+            writer.writerow([row[key] for key, _ in COLUMNS])
+        writer.writerow(["Total", "", "", "", "", document["total_amount"]])
+
+
+def _render_xlsx(document: Dict[str, Any], path: str) -> None:
+    from openpyxl import Workbook
+    from openpyxl.styles import Font
+
+    wb = Workbook()
+    ws = wb.active
+    ws.title = f"Invoice {document['id']}"
+    ws.append(["Invoice", document["id"]])
+    ws.append(["Client", document["client_name"]])
+    ws.append(["Period", document["period_start"], document["period_end"]])
+    ws.append([])
+    ws.append([label for _, label in COLUMNS])
+    for cell in ws[ws.max_row]:
+        cell.font = Font(bold=True)
+    for row in document["rows"]:
+        ws.append([row[key] for key, _ in COLUMNS])
+    ws.append(["Total", None, None, None, None, document["total_amount"]])
+    ws[f"A{ws.max_row}"].font = Font(bold=True)
+    wb.save(path)
+
+
+def _render_pdf(document: Dict[str, Any], path: str) -> None:
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
+
+    styles = getSampleStyleSheet()
+    story = [
+        # Paragraph text is markup: escape the values ('&' or '<' in a client name breaks the parse).
+        # Table cells below are plain strings and are drawn as-is.
+        Paragraph(escape(f"Invoice #{document['id']}"), styles["Title"]),
+        Paragraph(escape(f"Client: {document['client_name']}"), styles["Normal"]),
+        Paragraph(escape(f"Period: {document['period_start']} to {document['period_end']}"), styles["Normal"]),
+        Spacer(1, 12),
+    ]
+    data = [[label for _, label in COLUMNS]]
+    data += [[str(row[key]) for key, _ in COLUMNS] for row in document["rows"]]
+    data.append(["Total", "", "", "", "", str(document["total_amount"])])
+    table = Table(data, repeatRows=1)
+    table.setStyle(TableStyle([
+        ("BACKGROUND", (0, 0), (-1, 0), colors.lightgrey),
+        ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+        ("FONTNAME", (0, -1), (-1, -1), "Helvetica-Bold"),
+        ("GRID", (0, 0), (-1, -1), 0.25, colors.grey),
+        ("ALIGN", (3, 1), (-1, -1), "RIGHT"),
+    ]))
+    story.append(table)
+    SimpleDocTemplate(path, pagesize=A4).build(story)
+
+
+_RENDERERS = {"csv": _render_csv, "xlsx": _render_xlsx, "pdf": _render_pdf}
+
+
+def render_invoice_file(document: Dict[str, Any], fmt: str) -> str:
+    """Worker entry point: renders one invoice document and returns the file path."""
+    os.makedirs(RENDER_DIR, exist_ok=True)
+    path = document_path(document, fmt)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    _RENDERERS[fmt](document, tmp_path)
+    os.replace(tmp_path, path)  # atomic, readers never see a half-written file
+    for stale in glob.glob(os.path.join(RENDER_DIR, f"{document['id']}.*.{fmt}")):
+        if stale != path:
+            try:
+                os.remove(stale)
+            except OSError:
+                pass
+    return path
+
+
+# --- job tracking (API process) ---
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=MAX_WORKERS)
+    return _executor
+
+
+def shutdown() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def _on_done(job_id: str, future: Future) -> None:
+    with _jobs_lock:
+        job = _jobs[job_id]
+        error = future.exception()
+        if error is not None:
+            job["status"] = "failed"
+            job["error"] = str(error)
+        else:
+            job["status"] = "done"
+
+
+def _evict_finished() -> None:
+    # _jobs is insertion ordered; drop the oldest finished jobs, never queued/running ones
+    excess = len(_jobs) - MAX_JOBS
+    if excess <= 0:
+        return
+    for job_id in [job_id for job_id, job in _jobs.items() if job["status"] in ("done", "failed")][:excess]:
+        del _jobs[job_id]
+
+
+def submit(document: Dict[str, Any], fmt: str, force: bool = False) -> Dict[str, Any]:
+    """Queues a render job, or returns a finished job right away when the file is cached."""
+    job = {
+        "job_id": uuid.uuid4().hex,
+        "invoice_id": document["id"],
+        "format": fmt,
+        "status": "queued",
+        "error": None,
+    }
+    with _jobs_lock:
+        _jobs[job["job_id"]] = job
+        _evict_finished()
+
+    if not force and os.path.exists(document_path(document, fmt)):
+        job["status"] = "done"
+        return dict(job)
+
+    future = _get_executor().submit(render_invoice_file, document, fmt)
+    future.add_done_callback(lambda f, job_id=job["job_id"]: _on_done(job_id, f))
+    with _jobs_lock:
+        if job["status"] == "queued":
+            job["status"] = "running"
+        return dict(job)
+
+
+def get_job(job_id: str) -> Optional[Dict[str, Any]]:
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        return dict(job) if job else None
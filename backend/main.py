@@ -1,8 +1,8 @@
 from fastapi import FastAPI, HTTPException, Depends, Query, status, Cookie, Response
-from pydantic import BaseModel
+from pydantic import BaseModel, field_validator
 from typing import Annotated, Optional
 
-from sqlalchemy import text
+from sqlalchemy import text, bindparam
 import models
 from database import engine, SessionLocal
 from sqlalchemy.orm import Session
@@ -10,20 +10,50 @@ from fastapi.middleware.cors import CORSMiddleware
 
 from datetime import date, datetime, timedelta
 from typing import List, Dict, Any, Optional
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse, FileResponse, PlainTextResponse
+from fastapi import Request
+import asyncio
+import os
 from seed_data import seed_initial_data
+from utils import monday_of
+from scenarios import load_portfolio, run_scenarios
+from allocation import staffing_intervals, sweep_over_allocation
+import events
+import versions
+import invoice_render
+import recompute_queue
+import period_close
+import archive
+import search_index
+from timeline_index import timeline
+import batch
+import profiling
+import project_clone
+import group_commit
+import row_json
+import reconcile
+import changes
+import rate_history
+import burn
+import admission
 
 # routes/invoices.py (or inside your main app file if you keep routes together)
 from sqlalchemy import func, and_
 # from database import get_db   # <-- removed (you define get_db below)
 
 app = FastAPI()
+app.router.route_class = profiling.ProfiledRoute  # lets the profiler follow sync endpoints into the threadpool
 
 ALLOWED_ORIGINS = [
     "http://localhost:5173",
     "http://127.0.0.1:5173",
 ]
 
+# Per-workload concurrency limits (writes / reads / reports), see admission.py.
+# Added before CORS so shed 503s still carry the CORS headers.
+if admission.ENABLED:
+    app.add_middleware(admission.AdmissionMiddleware)
+
 # Allows me to call these APIs from the frontend
 app.add_middleware(
     CORSMiddleware,
@@ -31,14 +61,15 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Profile-Id", "Retry-After"],
 )
 
-models.Base.metadata.create_all(bind=engine)
-
+# Opt-in request profiling (PROFILING_ENABLED=1), see profiling.py
+if profiling.ENABLED:
+    app.add_middleware(profiling.ProfilingMiddleware)
+    profiling.install_sql_timing(engine)
 
-# --- helper: week start (Monday) ---
-def monday_of(d: date) -> date:
-    return d - timedelta(days=d.weekday())
+models.Base.metadata.create_all(bind=engine)
 
 # --- schema for the response rows (optional, but nice) ---
 class UtilizationRow(BaseModel):
@@ -49,6 +80,50 @@ class UtilizationRow(BaseModel):
     staffed_hours: float
     actual_hours: float
     utilization_pct: Optional[float]  # null when staffed is 0
+
+# Row schemas for the list endpoints (documentation only: they return row_json responses)
+class UserRow(BaseModel):
+    id: int
+    email: Optional[str]
+    name: Optional[str]
+    role: Optional[str]
+
+class ProjectRow(BaseModel):
+    id: int
+    name: Optional[str]
+    client_name: Optional[str]
+    start_date: Optional[str]
+    end_date: Optional[str]
+    started: Optional[bool]
+
+class StaffingRow(BaseModel):
+    id: int
+    project_id: Optional[int]
+    user_id: Optional[int]
+    role_name: Optional[str]
+    hourly_rate: Optional[int]
+    forecast_hours_initial: Optional[int]
+    forecast_hours_remaining: Optional[int]
+
+class TaskRow(BaseModel):
+    id: int
+    phase_id: Optional[int]
+    title: Optional[str]
+    description: Optional[str]
+    start_date: Optional[str]
+    end_date: Optional[str]
+    due_date: Optional[str]
+    status: Optional[str]
+    budget: Optional[int]
+    actual_spend: Optional[int]
+
+class TimeEntryRow(BaseModel):
+    id: int
+    task_id: Optional[int]
+    user_id: Optional[int]
+    work_date: Optional[str]
+    hours: Optional[float]
+    is_billable: Optional[bool]
     
 # Pydantic model for user creation validation
 class UsersBase(BaseModel):
@@ -64,6 +139,13 @@ class ProjectsBase(BaseModel):
     end_date: str
     started: bool = False
     
+class ProjectCloneRequest(BaseModel):
+    name: str
+    client_name: Optional[str] = None     # defaults to the source project's client
+    start_date: str                       # all dates are shifted so the clone starts here
+    include_staffing: bool = True
+    include_assignments: bool = False
+
 class ProjectStaffingBase(BaseModel):
     staffing_id: int | None = None  # Optional, for existing entries
     project_id: int
@@ -99,6 +181,13 @@ class TaskAssignmentsBase(BaseModel):
     task_id: int
     user_id: int
     hourly_rate: int
+    effective_from: Optional[str] = None  # date a rate change takes effect (default: today)
+
+    # compared with work_date as a string, so anything but YYYY-MM-DD would misprice hours (422)
+    @field_validator("effective_from")
+    @classmethod
+    def _iso_effective_from(cls, value: Optional[str]) -> Optional[str]:
+        return rate_history.parse_effective_from(value)
     
 class TimeEntryBase(BaseModel):
     task_id: int
@@ -114,9 +203,47 @@ class InvoicesBase(BaseModel):
     period_start: str
     period_end: str
     total_amount: int
+
+class ScenarioOverride(BaseModel):
+    user_id: int
+    project_id: int | None = None       # None applies the override on every project the user is staffed on
+    hourly_rate: float | None = None
+    allocation_pct: float | None = None  # 100 = unchanged remaining forecast hours
+
+class Scenario(BaseModel):
+    name: str
+    overrides: List[ScenarioOverride] = []
+
+class ScenarioRequest(BaseModel):
+    project_ids: List[int]
+    scenarios: List[Scenario] = []
+    as_of: str | None = None  # YYYY-MM-DD, defaults to today
+
+class BatchSubRequest(BaseModel):
+    id: str | None = None                   # echoed back so clients can match results
+    path: str                               # e.g. "/projects/3/staffing/"
+    params: Dict[str, Any] = {}
+    headers: Dict[str, str] = {}            # e.g. {"If-None-Match": "..."}
+
+class BatchRequest(BaseModel):
+    requests: List[BatchSubRequest]
+    parallel: bool = False                  # True: run concurrently, one session per sub-request
+
+class PeriodCloseRequest(BaseModel):
+    month: str  # YYYY-MM
+
+class InvoiceRenderBatch(BaseModel):
+    month: str                                   # YYYY-MM, matched against invoices.period_start
+    formats: List[str] = ["csv", "xlsx", "pdf"]
+    force: bool = False
     
 # Dependency to get DB session
 def get_db():
+    # Inside a /batch call every sub-request shares the batch's session (closed by the batch)
+    shared = batch.current_session.get()
+    if shared is not None:
+        yield shared
+        return
     db = SessionLocal()
     try:
         yield db
@@ -125,13 +252,69 @@ def get_db():
         
 db_dependency = Annotated[Session, Depends(get_db)]
 
+# Session for project-scoped reports: archived projects (see archive.py) are no longer in
+# MySQL, so their reads are answered from the archive files instead.
+def get_report_db(project_id: int):
+    if archive.is_archived(project_id):
+        check = SessionLocal()
+        try:
+            in_mysql = check.query(models.Projects.id).filter(models.Projects.id == project_id).first() is not None
+        finally:
+            check.close()
+        if not in_mysql:
+            yield from archive.open_session(project_id)
+            return
+    yield from get_db()
+
+report_db_dependency = Annotated[Session, Depends(get_report_db)]
+
+# Resolve the project a task belongs to (tasks -> project_phases -> project)
+def get_project_id_for_task(db: Session, task_id: int) -> Optional[int]:
+    project_id_sql = text("""
+        SELECT phases.project_id
+        FROM tasks
+        JOIN project_phases AS phases ON tasks.phase_id = phases.id
+        WHERE tasks.id = :task_id
+        LIMIT 1
+    """)
+    project_result = db.execute(project_id_sql, {"task_id": task_id}).fetchone()
+    return project_result.project_id if project_result else None
+
+# Conditional GET for project-scoped reads: answers 304 before any heavy query runs
+# when the client's If-None-Match still matches the project's current version.
+def conditional_get(request: Request, response: Response, db: Session, project_id: int) -> Optional[Response]:
+    version = versions.project_version(db, project_id)
+    if version is None:
+        return None
+    etag = versions.etag_for(request, project_id, version)
+    if versions.not_modified(request, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "private, no-cache"  # always revalidate
+    return None
+
 @app.on_event("startup")
 async def on_startup():
     db = SessionLocal()
     try:
         seed_initial_data(db)
+        changes.install_triggers(engine)
+        search_index.rebuild(db)
+        timeline.rebuild(db)
     finally:
         db.close()
+    admission.start()
+    recompute_queue.start()
+    if group_commit.ENABLED:
+        group_commit.start()
+    reconcile.start()
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await reconcile.stop()
+    await group_commit.stop()
+    await recompute_queue.stop()
+    invoice_render.shutdown()
 
 # Mock login.
 @app.post("/login/", status_code=status.HTTP_200_OK)
@@ -146,14 +329,99 @@ async def login(payloadCreds: LoginRequest, db: db_dependency):
 
     return {"user_id": user.id, "role": user.role}
 
-@app.get("/users/", status_code=status.HTTP_200_OK)
+@app.get("/users/", response_model=List[UserRow], status_code=status.HTTP_200_OK)
 async def get_users(db: db_dependency, role: Optional[str] = Query(None)):
+    users = db.query(models.Users)
     if role:
-        users = db.query(models.Users).filter(models.Users.role == role).all()
-        return users
-    users = db.query(models.Users).all()
-    return users
+        users = users.filter(models.Users.role == role)
+    return row_json.model_rows_response(users, models.Users)
+
 
+# Several GET sub-requests in one round trip. By default they share one session (one pooled
+# connection and one consistent snapshot) and run in order; parallel=true runs them concurrently.
+@app.post("/batch", status_code=status.HTTP_200_OK)
+async def run_batch(payload: BatchRequest):
+    if len(payload.requests) > batch.MAX_SUBREQUESTS:
+        raise HTTPException(status_code=400, detail=f"At most {batch.MAX_SUBREQUESTS} sub-requests per batch")
+    sub_requests = [sub.model_dump() for sub in payload.requests]
+
+    if payload.parallel:
+        return {"responses": await batch.run(app, sub_requests, None)}
+
+    db = SessionLocal()
+    try:
+        return {"responses": await batch.run(app, sub_requests, db)}
+    finally:
+        db.close()
+
+# Ranked search over project names/clients and task titles/descriptions (in-memory index)
+@app.get("/search/", status_code=status.HTTP_200_OK)
+def search(
+    db: db_dependency,
+    q: str = Query(..., min_length=1),
+    type: Optional[str] = Query(None, description="'project' or 'task'"),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+):
+    if type is not None and type not in ("project", "task"):
+        raise HTTPException(status_code=400, detail="type must be 'project' or 'task'")
+    if not search_index.is_ready():
+        search_index.rebuild(db)
+    return {"query": q, "limit": limit, "offset": offset, **search_index.search(q, type, limit, offset)}
+
+# Phases and tasks active in a date window across all projects (interval index).
+# A single day (start == end) is a stabbing query.
+@app.get("/timeline/", status_code=status.HTTP_200_OK)
+def get_timeline(
+    db: db_dependency,
+    start: str = Query(..., description="YYYY-MM-DD"),
+    end: Optional[str] = Query(None, description="YYYY-MM-DD, defaults to start"),
+    type: Optional[str] = Query(None, description="'phase' or 'task'"),
+    project_id: Optional[int] = Query(None),
+    user_id: Optional[int] = Query(None, description="Only tasks assigned to this user"),
+):
+    try:
+        window_start = datetime.fromisoformat(start).date()
+        window_end = datetime.fromisoformat(end).date() if end else window_start
+    except Exception:
+        raise HTTPException(400, "Invalid 'start' or 'end' date. Use YYYY-MM-DD.")
+    if not timeline.ready:
+        timeline.rebuild(db)
+
+    items = timeline.active(window_start, window_end)
+    if type is not None:
+        items = [item for item in items if item["type"] == type]
+    if project_id is not None:
+        items = [item for item in items if item["project_id"] == project_id]
+    if user_id is not None:
+        task_ids = {tid for (tid,) in db.query(models.TaskAssignments.task_id)
+                    .filter(models.TaskAssignments.user_id == user_id).all()}
+        items = [item for item in items if item["type"] == "task" and item["id"] in task_ids]
+    items.sort(key=lambda item: (item["start_date"] or "", item["type"], item["id"]))
+    return {"start": window_start.isoformat(), "end": window_end.isoformat(), "items": items}
+
+# Tasks due in the next `days` days (optionally for one user)
+@app.get("/timeline/due/", status_code=status.HTTP_200_OK)
+def get_tasks_due(
+    db: db_dependency,
+    user_id: Optional[int] = Query(None),
+    start: Optional[str] = Query(None, description="YYYY-MM-DD, defaults to today"),
+    days: int = Query(14, ge=0, le=366),
+):
+    try:
+        window_start = datetime.fromisoformat(start).date() if start else date.today()
+    except Exception:
+        raise HTTPException(400, "Invalid 'start' date. Use YYYY-MM-DD.")
+    window_end = window_start + timedelta(days=days)
+    if not timeline.ready:
+        timeline.rebuild(db)
+
+    tasks = timeline.due_between(window_start, window_end)
+    if user_id is not None:
+        task_ids = {tid for (tid,) in db.query(models.TaskAssignments.task_id)
+                    .filter(models.TaskAssignments.user_id == user_id).all()}
+        tasks = [task for task in tasks if task["id"] in task_ids]
+    return {"start": window_start.isoformat(), "end": window_end.isoformat(), "tasks": tasks}
 
 @app.post("/users/", status_code=status.HTTP_201_CREATED)
 async def create_user(user: UsersBase, db: db_dependency):
@@ -161,13 +429,15 @@ async def create_user(user: UsersBase, db: db_dependency):
     db.add(db_user)
     db.commit()
     
-@app.get("/projects/", status_code=status.HTTP_200_OK)
+@app.get("/projects/", response_model=List[ProjectRow], status_code=status.HTTP_200_OK)
 async def get_projects(db: db_dependency):
-    projects = db.query(models.Projects).all()
-    return projects
+    return row_json.model_rows_response(db.query(models.Projects), models.Projects)
 
 @app.get("/projects/{project_id}/", status_code=status.HTTP_200_OK)
-async def get_project_specific(project_id: int, db: db_dependency):
+async def get_project_specific(project_id: int, request: Request, response: Response, db: report_db_dependency):
+    not_modified = conditional_get(request, response, db, project_id)
+    if not_modified is not None:
+        return not_modified
     project = db.query(models.Projects).filter(models.Projects.id == project_id).first()
     return project
 
@@ -178,6 +448,7 @@ async def create_project(project: ProjectsBase, db: db_dependency):
     db.add(db_project)
     db.commit()
     db.refresh(db_project)
+    search_index.index_project(db_project)
     return db_project
 
 @app.put("/projects/{project_id}/", status_code=status.HTTP_200_OK)
@@ -191,12 +462,16 @@ async def update_project(project_id: int, project: ProjectsBase, db: db_dependen
     
     db.commit()
     db.refresh(db_project)
+    search_index.index_project(db_project)
     return db_project
 
-@app.get("/projects/{project_id}/staffing/", status_code=status.HTTP_200_OK)
-async def get_project_staffing(project_id: int, db: db_dependency):
-    staffing = db.query(models.ProjectStaffing).filter(models.ProjectStaffing.project_id == project_id).all()
-    return staffing
+@app.get("/projects/{project_id}/staffing/", response_model=List[StaffingRow], status_code=status.HTTP_200_OK)
+async def get_project_staffing(project_id: int, request: Request, response: Response, db: report_db_dependency):
+    not_modified = conditional_get(request, response, db, project_id)
+    if not_modified is not None:
+        return not_modified
+    staffing = db.query(models.ProjectStaffing).filter(models.ProjectStaffing.project_id == project_id)
+    return row_json.model_rows_response(staffing, models.ProjectStaffing, headers_from=response)
 
 @app.put("/projects/{project_id}/staffing/", status_code=status.HTTP_200_OK)
 async def update_project_staffing(
@@ -226,13 +501,132 @@ async def update_project_staffing(
                     setattr(db_entry, key, value)
 
     db.commit()
+    events.publish(project_id, "staffing_updated", {})
     return {"message": "Staffing updated successfully"}
 
 @app.get("/projects/{project_id}/phases/", status_code=status.HTTP_200_OK)
-async def get_project_phases(project_id: int, db: db_dependency):
+async def get_project_phases(project_id: int, request: Request, response: Response, db: report_db_dependency):
+    not_modified = conditional_get(request, response, db, project_id)
+    if not_modified is not None:
+        return not_modified
     phases = db.query(models.ProjectPhases).filter(models.ProjectPhases.project_id == project_id).all()
     return phases
 
+TREE_TASK_FIELDS = ["id", "phase_id", "title", "description", "start_date", "end_date", "due_date", "status", "budget", "actual_spend"]
+
+# Whole project in one call: phases -> tasks -> assignments (with user names) -> hour totals.
+# Always at most 4 set-based queries, whatever the project size.
+#   depth: 1 = phases, 2 = + tasks, 3 = + assignments
+#   fields: comma separated task fields to return (default: all)
+@app.get("/projects/{project_id}/tree", status_code=status.HTTP_200_OK)
+def get_project_tree(
+    project_id: int,
+    request: Request,
+    response: Response,
+    db: report_db_dependency,
+    depth: int = Query(3, ge=1, le=3),
+    hours: bool = Query(True, description="Include logged hour totals"),
+    fields: Optional[str] = Query(None, description="e.g. id,title,status"),
+):
+    not_modified = conditional_get(request, response, db, project_id)
+    if not_modified is not None:
+        return not_modified
+
+    task_fields = TREE_TASK_FIELDS
+    if fields:
+        task_fields = [f.strip() for f in fields.split(",") if f.strip()]
+        unknown = [f for f in task_fields if f not in TREE_TASK_FIELDS]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown task fields: {', '.join(unknown)}")
+        if "id" not in task_fields:
+            task_fields = ["id"] + task_fields
+
+    # 1) Phases
+    phases = (
+        db.query(models.ProjectPhases)
+          .filter(models.ProjectPhases.project_id == project_id)
+          .order_by(models.ProjectPhases.start_date, models.ProjectPhases.id)
+          .all()
+    )
+    tree = [
+        {
+            "id": ph.id,
+            "phase_name": ph.phase_name,
+            "start_date": ph.start_date,
+            "end_date": ph.end_date,
+        }
+        for ph in phases
+    ]
+    if depth < 2 or not phases:
+        return {"project_id": project_id, "phases": tree}
+
+    # 2) Tasks of every phase in one query (only the requested columns)
+    task_columns = [getattr(models.Tasks, f) for f in dict.fromkeys(task_fields + ["phase_id"])]
+    task_rows = (
+        db.query(*task_columns)
+          .join(models.ProjectPhases, models.ProjectPhases.id == models.Tasks.phase_id)
+          .filter(models.ProjectPhases.project_id == project_id)
+          .order_by(models.Tasks.start_date, models.Tasks.id)
+          .all()
+    )
+
+    # 3) Logged hours per (task, user) for the whole project
+    hours_by_task_user: Dict[tuple, float] = {}
+    if hours:
+        hours_sql = text("""
+            SELECT te.task_id AS task_id, te.user_id AS user_id, SUM(te.hours) AS hours
+            FROM time_entries te
+            JOIN tasks t ON t.id = te.task_id
+            JOIN project_phases ph ON ph.id = t.phase_id
+            WHERE ph.project_id = :project_id
+            GROUP BY te.task_id, te.user_id
+        """)
+        for r in db.execute(hours_sql, {"project_id": project_id}).fetchall():
+            hours_by_task_user[(int(r.task_id), int(r.user_id))] = float(r.hours or 0.0)
+
+    # 4) Assignments with user names
+    assignments_by_task: Dict[int, List[Dict[str, Any]]] = {}
+    if depth >= 3:
+        assignment_rows = (
+            db.query(models.TaskAssignments, models.Users.name)
+              .join(models.Tasks, models.Tasks.id == models.TaskAssignments.task_id)
+              .join(models.ProjectPhases, models.ProjectPhases.id == models.Tasks.phase_id)
+              .outerjoin(models.Users, models.Users.id == models.TaskAssignments.user_id)
+              .filter(models.ProjectPhases.project_id == project_id)
+              .all()
+        )
+        for ta, user_name in assignment_rows:
+            item = {
+                "id": ta.id,
+                "user_id": ta.user_id,
+                "user_name": user_name,
+                "hourly_rate": ta.hourly_rate,
+            }
+            if hours:
+                item["hours"] = round(hours_by_task_user.get((ta.task_id, ta.user_id), 0.0), 2)
+            assignments_by_task.setdefault(ta.task_id, []).append(item)
+
+    task_hours: Dict[int, float] = {}
+    for (task_id, _), h in hours_by_task_user.items():
+        task_hours[task_id] = task_hours.get(task_id, 0.0) + h
+
+    tasks_by_phase: Dict[int, List[Dict[str, Any]]] = {}
+    for row in task_rows:
+        mapping = row._mapping
+        task = {f: mapping[f] for f in task_fields}
+        if hours:
+            task["total_hours"] = round(task_hours.get(mapping["id"], 0.0), 2)
+        if depth >= 3:
+            task["assignments"] = assignments_by_task.get(mapping["id"], [])
+        tasks_by_phase.setdefault(mapping["phase_id"], []).append(task)
+
+    for phase in tree:
+        phase["tasks"] = tasks_by_phase.get(phase["id"], [])
+        if hours:
+            phase["total_hours"] = round(sum(t["total_hours"] for t in phase["tasks"]), 2)
+
+    return {"project_id": project_id, "phases": tree}
+
 @app.post("/projects/{project_id}/phases/", status_code=status.HTTP_201_CREATED)
 async def create_project_phase(
     project_id: int,
@@ -262,21 +656,45 @@ async def create_project_phase(
                     setattr(db_phase, key, value)
     
     db.commit()
+    timeline.refresh_project(db, project_id)
+    events.publish(project_id, "phases_updated", {})
     return {"message": "Phases updated successfully"}
 
-@app.get("/tasks/", status_code=status.HTTP_200_OK)
+@app.get("/tasks/", response_model=List[TaskRow], status_code=status.HTTP_200_OK)
 async def get_phase_tasks(
     db: db_dependency,
     phase_id: Optional[int] = Query(None),
     user_id: Optional[int] = Query(None)
 ):    #Can fetch tasks by phase_id or user_id
+    tasks = db.query(models.Tasks)
     if phase_id is not None:
-        tasks = db.query(models.Tasks).filter(models.Tasks.phase_id == phase_id).all()
+        tasks = tasks.filter(models.Tasks.phase_id == phase_id)
     elif user_id is not None:
-        assignments = db.query(models.TaskAssignments).filter(models.TaskAssignments.user_id == user_id).all()
-        task_ids = [assignment.task_id for assignment in assignments]
-        tasks = db.query(models.Tasks).filter(models.Tasks.id.in_(task_ids)).all()
-    return tasks
+        assigned = db.query(models.TaskAssignments.task_id).filter(models.TaskAssignments.user_id == user_id)
+        tasks = tasks.filter(models.Tasks.id.in_(assigned.scalar_subquery()))
+    return row_json.model_rows_response(tasks, models.Tasks)
+
+# Live change feed (Server-Sent Events) for one project.
+# Events: time_entry_logged, task_spend_changed, staffing_remaining_changed, staffing_updated, phases_updated
+@app.get("/projects/{project_id}/events", status_code=status.HTTP_200_OK)
+async def project_events(project_id: int, request: Request):
+    async def stream():
+        sub = events.subscribe(project_id)
+        queue = sub[1]
+        try:
+            yield "retry: 3000\n\n"
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"  # keeps proxies from closing idle streams
+                    continue
+                yield events.format_sse(event)
+        finally:
+            events.unsubscribe(project_id, sub)
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return StreamingResponse(stream(), media_type="text/event-stream", headers=headers)
 
 # Creates a new task within a specific phase
 @app.post("/tasks/", status_code=status.HTTP_201_CREATED)
@@ -285,6 +703,9 @@ async def create_phase_task(task: TaskBase, db: db_dependency):
     print("Task: ", db_task)
     db.add(db_task)
     db.commit()
+    project_id = get_project_id_for_task(db, db_task.id)
+    search_index.index_task(db_task, project_id)
+    timeline.add_task(db_task, project_id)
     return {"message": "Task created successfully", "task_id": db_task.id}
 
 
@@ -302,6 +723,11 @@ async def get_task_assignments(
         assignments = db.query(models.TaskAssignments).filter(models.TaskAssignments.user_id == user_id).all()
     return assignments
 
+# Effective-dated rate history of a task's assignments
+@app.get("/projects/tasks/{task_id}/rates", status_code=status.HTTP_200_OK)
+def get_task_rate_history(task_id: int, db: db_dependency):
+    return rate_history.rate_history(db, task_id)
+
 @app.put("/projects/tasks/{task_id}/assignments", status_code=status.HTTP_200_OK)
 async def update_task_assignments(
     task_id: int,
@@ -321,11 +747,13 @@ async def update_task_assignments(
         data = incoming.model_dump()
         assignment_id: Optional[int] = data.pop("assignment_id", None)
         data.pop("task_id", None)  # never allow task_id override
+        effective_from = data.pop("effective_from", None)
 
         if assignment_id and assignment_id in by_id:
             # Update by id
             row = by_id[assignment_id]
             seen_ids.add(row.id)
+            rate_history.record_rate(db, task_id, data.get("user_id", row.user_id), data.get("hourly_rate"), row.hourly_rate, effective_from)
             for k, v in data.items():
                 setattr(row, k, v)
 
@@ -335,11 +763,13 @@ async def update_task_assignments(
                 # Upsert by (task_id, user_id) to avoid duplicates
                 row = by_user[user_id]
                 seen_ids.add(row.id)
+                rate_history.record_rate(db, task_id, user_id, data.get("hourly_rate"), row.hourly_rate, effective_from)
                 for k, v in data.items():
                     setattr(row, k, v)
             else:
                 # Create new
                 row = models.TaskAssignments(task_id=task_id, **data)
+                rate_history.record_rate(db, task_id, user_id, data.get("hourly_rate"), None)
                 db.add(row)
                 db.flush()  # to get row.id
                 seen_ids.add(row.id)
@@ -347,35 +777,49 @@ async def update_task_assignments(
                 by_user[row.user_id] = row
 
     db.commit()
+    recompute_queue.request("task_spend", task_id)
     return {"message": "Task assignments updated successfully"}
 
 #Get time entry from Time Entries table based on task_id and user_id.
-@app.get("/tasks/timeentries/", status_code=status.HTTP_200_OK)
+@app.get("/tasks/timeentries/", response_model=List[TimeEntryRow], status_code=status.HTTP_200_OK)
 async def get_time_entries(
     db: db_dependency,
     task_id: Optional[int] = Query(None),
     user_id: Optional[int] = Query(None)
 ):
-    if task_id is not None and user_id is not None:
-        entries = db.query(models.TimeEntries).filter(
-            models.TimeEntries.task_id == task_id,
-            models.TimeEntries.user_id == user_id
-        ).all()
-    elif task_id is not None:
-        entries = db.query(models.TimeEntries).filter(models.TimeEntries.task_id == task_id).all()
-    elif user_id is not None:
-        entries = db.query(models.TimeEntries).filter(models.TimeEntries.user_id == user_id).all()
-    else:
-        entries = db.query(models.TimeEntries).all()
-    
-    return entries
+    entries = db.query(models.TimeEntries)
+    if task_id is not None:
+        entries = entries.filter(models.TimeEntries.task_id == task_id)
+    if user_id is not None:
+        entries = entries.filter(models.TimeEntries.user_id == user_id)
+    return row_json.model_rows_response(entries, models.TimeEntries)
 
 # Add time entry to Time Entries table.
 @app.post("/tasks/timeentries/", status_code=status.HTTP_200_OK)
 async def log_time_entry(entry: TimeEntryBase, db: db_dependency):
-    db_entry = models.TimeEntries(**entry.model_dump())
-    db.add(db_entry)
-    db.commit()
+    # One lookup serves the closed-month check, events and the recomputes
+    project_id, closed = period_close.project_and_closed(db, entry.task_id, entry.work_date)
+    if closed:
+        raise HTTPException(status_code=409, detail="This month is closed for billing")
+
+    if group_commit.ENABLED:
+        db.rollback()  # end the read transaction; the row is written by the group-commit flusher
+        await group_commit.submit(entry.model_dump())  # returns once its batch is committed
+    else:
+        db_entry = models.TimeEntries(**entry.model_dump())
+        db.add(db_entry)
+        db.commit()
+
+    if project_id is not None:
+        events.publish(project_id, "time_entry_logged", {
+            "task_id": entry.task_id,
+            "user_id": entry.user_id,
+            "work_date": entry.work_date,
+            "hours": entry.hours,
+            "is_billable": entry.is_billable,
+        })
+        recompute_queue.request("staffing_hours", project_id, entry.user_id)
+    recompute_queue.request("task_spend", entry.task_id)
     return {"message": "Time entry logged successfully"}
 
 #
@@ -404,18 +848,22 @@ async def update_task_contributors(
         assign_dict = assign.model_dump()
         assign_id = assign_dict.pop("taskassign_id", None)
         assign_dict.pop("task_id", None)  # Avoid overwriting task_id
+        effective_from = assign_dict.pop("effective_from", None)
 
         if assign_id is not None and assign_id in existing_ids:
             # Update existing assignment
             db_assignment = db.query(models.TaskAssignments).filter(models.TaskAssignments.id == assign_id).first()
+            rate_history.record_rate(db, task_id, assign_dict.get("user_id", db_assignment.user_id), assign_dict.get("hourly_rate"), db_assignment.hourly_rate, effective_from)
             for key, value in assign_dict.items():
                 setattr(db_assignment, key, value)
         else:
             # Create new assignment
             db_assignment = models.TaskAssignments(task_id=task_id, **assign_dict)
+            rate_history.record_rate(db, task_id, assign_dict.get("user_id"), assign_dict.get("hourly_rate"), None)
             db.add(db_assignment)
 
     db.commit()
+    recompute_queue.request("task_spend", task_id)
     return {"message": "Task contributors updated successfully"}
 
 # Update staffing data depending on project ID
@@ -440,27 +888,8 @@ async def dynamic_staffing_adjustment(
     return {"message": "Forecast hours updated successfully"}
 
 
-# Get total hours logged by a user on a specific project
-@app.patch("/tasks/{task_id}/users/{user_id}/total-hours/", status_code=status.HTTP_200_OK)
-async def get_total_hours(
-    task_id: int,
-    user_id: int,
-    db: db_dependency
-):
-    # Get project_id from the given task_id
-    project_id_sql = text("""
-        SELECT phases.project_id
-        FROM tasks
-        JOIN project_phases AS phases ON tasks.phase_id = phases.id
-        WHERE tasks.id = :task_id
-        LIMIT 1
-    """)
-    project_result = db.execute(project_id_sql, {"task_id": task_id}).fetchone()
-    if not project_result:
-        raise HTTPException(status_code=404, detail="Project not found for given task_id")
-    project_id = project_result.project_id
-
-    # Get total hours for this user on this project
+# Total hours logged by a user on a project
+def get_logged_hours(db: Session, project_id: int, user_id: int) -> float:
     total_hours_sql = text("""
         SELECT SUM(tentries.hours) AS total_hours
         FROM time_entries AS tentries
@@ -469,8 +898,12 @@ async def get_total_hours(
         WHERE tentries.user_id = :user_id AND phases.project_id = :project_id
     """)
     result = db.execute(total_hours_sql, {"user_id": user_id, "project_id": project_id}).fetchone()
-    total_hours = result.total_hours if result.total_hours is not None else 0.0
-    
+    return result.total_hours if result.total_hours is not None else 0.0
+
+# Recomputes a user's logged hours on a project and refreshes project_staffing.forecast_hours_remaining.
+def recompute_staffing_hours(db: Session, project_id: int, user_id: int) -> float:
+    total_hours = get_logged_hours(db, project_id, user_id)
+
     # Update forecast_hours_remaining in project_staffing
     update_sql = text("""
         UPDATE project_staffing
@@ -480,31 +913,36 @@ async def get_total_hours(
     db.execute(update_sql, {"total_hours": total_hours, "user_id": user_id, "project_id": project_id})
     db.commit()
 
-    return {"total_hours": total_hours}
-
-
-# Get/update actual spend on a task level
-@app.patch("/tasks/{task_id}/actual-spend/", status_code=status.HTTP_200_OK,)
-async def get_and_update_actual_spend(
-    task_id: int,
-    db: db_dependency,
-):
+    remaining = db.query(models.ProjectStaffing.forecast_hours_remaining).filter(
+        models.ProjectStaffing.project_id == project_id,
+        models.ProjectStaffing.user_id == user_id,
+    ).first()
+    events.publish(project_id, "staffing_remaining_changed", {
+        "user_id": user_id,
+        "total_hours": float(total_hours),
+        "forecast_hours_remaining": remaining[0] if remaining else None,
+    })
+    return total_hours
+
+# A task's actual spend from its time entries and assignment rates
+def get_task_actual_spend(db: Session, task_id: int) -> float:
     # Calculate the actual spend based on the time entries and hourly rates for this task across all users assigned to it.
-    actual_spend_sql = text("""
-        SELECT SUM(user_spend) AS actual_spend
-        FROM (
-            SELECT ta.user_id, ta.hourly_rate, COALESCE(SUM(te.hours), 0) AS total_hours,
-                   ta.hourly_rate * COALESCE(SUM(te.hours), 0) AS user_spend
-            FROM task_assignments AS ta
-            LEFT JOIN time_entries AS te
-                ON ta.task_id = te.task_id AND ta.user_id = te.user_id
-            WHERE ta.task_id = :task_id
-            GROUP BY ta.user_id, ta.hourly_rate
-        ) AS spend_per_user
+    # Each entry is priced at the assignment rate in effect on its work_date (see rate_history.py)
+    actual_spend_sql = text(f"""
+        SELECT SUM(COALESCE(te.hours, 0) * {rate_history.rate_expr()}) AS actual_spend
+        FROM task_assignments AS ta
+        JOIN time_entries AS te
+            ON ta.task_id = te.task_id AND ta.user_id = te.user_id
+        {rate_history.rate_join(rate_history.TASK_SCOPE)}
+        WHERE ta.task_id = :task_id
     """)
     
     result = db.execute(actual_spend_sql, {"task_id": task_id}).fetchone()
-    actual_spend = result.actual_spend if result.actual_spend is not None else 0.0
+    return result.actual_spend if result.actual_spend is not None else 0.0
+
+# Recomputes a task's actual spend and stores it on the task.
+def recompute_task_actual_spend(db: Session, task_id: int) -> float:
+    actual_spend = get_task_actual_spend(db, task_id)
 
     # Update the actual_spend field in the Tasks table
     db_task = db.query(models.Tasks).filter(models.Tasks.id == task_id).first()
@@ -513,6 +951,65 @@ async def get_and_update_actual_spend(
         db.commit()
         db.refresh(db_task)
 
+        project_id = get_project_id_for_task(db, task_id)
+        if project_id is not None:
+            events.publish(project_id, "task_spend_changed", {
+                "task_id": task_id,
+                "actual_spend": float(actual_spend),
+            })
+    return actual_spend
+
+# Background (coalesced) versions of the two recomputes above, each with its own session.
+def _recompute_staffing_hours_job(project_id: int, user_id: int) -> None:
+    db = SessionLocal()
+    try:
+        recompute_staffing_hours(db, project_id, user_id)
+    finally:
+        db.close()
+
+def _recompute_task_spend_job(task_id: int) -> None:
+    db = SessionLocal()
+    try:
+        recompute_task_actual_spend(db, task_id)
+    finally:
+        db.close()
+
+recompute_queue.register("staffing_hours", _recompute_staffing_hours_job)
+recompute_queue.register("task_spend", _recompute_task_spend_job)
+
+# Get total hours logged by a user on a specific project.
+# The totals are read with one aggregate query; only the writes (forecast_hours_remaining,
+# tasks.actual_spend) are queued (recompute_queue) instead of run on the request path.
+@app.patch("/tasks/{task_id}/users/{user_id}/total-hours/", status_code=status.HTTP_200_OK)
+async def get_total_hours(
+    task_id: int,
+    user_id: int,
+    db: db_dependency
+):
+    # Get project_id from the given task_id
+    project_id = get_project_id_for_task(db, task_id)
+    if project_id is None:
+        raise HTTPException(status_code=404, detail="Project not found for given task_id")
+
+    total_hours = get_logged_hours(db, project_id, user_id)
+    recompute_queue.request("staffing_hours", project_id, user_id)
+    initial = db.query(models.ProjectStaffing.forecast_hours_initial).filter(
+        models.ProjectStaffing.project_id == project_id,
+        models.ProjectStaffing.user_id == user_id,
+    ).first()
+    # What the queued recompute will store (GREATEST(initial - total, 0))
+    remaining = max((initial[0] or 0) - total_hours, 0) if initial else None
+    return {"total_hours": total_hours, "forecast_hours_remaining": remaining}
+
+
+# Get/update actual spend on a task level: computed now, stored on the task by a queued recompute
+@app.patch("/tasks/{task_id}/actual-spend/", status_code=status.HTTP_200_OK,)
+async def get_and_update_actual_spend(
+    task_id: int,
+    db: db_dependency,
+):
+    actual_spend = get_task_actual_spend(db, task_id)
+    recompute_queue.request("task_spend", task_id)
     return {"actual_spend": actual_spend}
 
 @app.get("/projects/{project_id}/users/{user_id}/timeentries/", status_code=status.HTTP_200_OK)
@@ -537,8 +1034,108 @@ async def get_time_entries_by_date_range(
     return entries
 
 
+# Contributor timesheet: task x day hours grid for a week (or any date range) across all projects,
+# with row and column totals. One grouped query; assigned tasks without hours get empty rows.
+@app.get("/users/{user_id}/timesheet", status_code=status.HTTP_200_OK)
+def get_user_timesheet(
+    user_id: int,
+    db: db_dependency,
+    week: Optional[str] = Query(None, description="Any day of the week (YYYY-MM-DD)"),
+    start: Optional[str] = Query(None, description="YYYY-MM-DD, used with end instead of week"),
+    end: Optional[str] = Query(None, description="YYYY-MM-DD"),
+):
+    try:
+        if start and end:
+            range_start = datetime.fromisoformat(start).date()
+            range_end = datetime.fromisoformat(end).date()
+        else:
+            range_start = monday_of(datetime.fromisoformat(week).date() if week else date.today())
+            range_end = range_start + timedelta(days=6)
+    except Exception:
+        raise HTTPException(400, "Invalid date. Use YYYY-MM-DD.")
+    if range_end < range_start or (range_end - range_start).days > 366:
+        raise HTTPException(400, "Date range must be between 1 and 367 days.")
+
+    days = [range_start + timedelta(days=i) for i in range((range_end - range_start).days + 1)]
+    day_index = {d.isoformat(): i for i, d in enumerate(days)}
+
+    grid_sql = text("""
+        SELECT
+          t.id            AS task_id,
+          t.title         AS task_title,
+          ph.id           AS phase_id,
+          ph.phase_name   AS phase_name,
+          p.id            AS project_id,
+          p.name          AS project_name,
+          g.work_date     AS work_date,
+          g.hours         AS hours
+        FROM (
+            SELECT te.task_id AS task_id, te.work_date AS work_date, SUM(te.hours) AS hours
+            FROM time_entries te
+            WHERE te.user_id = :user_id
+              AND te.work_date BETWEEN :start AND :end
+            GROUP BY te.task_id, te.work_date
+            UNION ALL
+            SELECT ta.task_id AS task_id, NULL AS work_date, 0 AS hours
+            FROM task_assignments ta
+            WHERE ta.user_id = :user_id
+        ) AS g
+        JOIN tasks t ON t.id = g.task_id
+        JOIN project_phases ph ON ph.id = t.phase_id
+        JOIN projects p ON p.id = ph.project_id
+        ORDER BY p.name, ph.phase_name, t.title
+    """)
+    rows = db.execute(grid_sql, {
+        "user_id": user_id,
+        "start": range_start.isoformat(),
+        "end": range_end.isoformat(),
+    }).fetchall()
+
+    grid: Dict[int, Dict[str, Any]] = {}
+    day_totals = [0.0] * len(days)
+    for r in rows:
+        row = grid.get(r.task_id)
+        if row is None:
+            row = grid[r.task_id] = {
+                "task_id": r.task_id,
+                "task_title": r.task_title,
+                "phase_id": r.phase_id,
+                "phase_name": r.phase_name,
+                "project_id": r.project_id,
+                "project_name": r.project_name,
+                "hours": [0.0] * len(days),
+                "total": 0.0,
+            }
+        if r.work_date is None:
+            continue  # assignment-only row
+        i = day_index.get(str(r.work_date)[:10])
+        if i is None:
+            continue
+        h = float(r.hours or 0.0)
+        row["hours"][i] += h
+        row["total"] += h
+        day_totals[i] += h
+
+    # Round every figure the same way, after summing
+    for row in grid.values():
+        row["hours"] = [round(h, 2) for h in row["hours"]]
+        row["total"] = round(row["total"], 2)
+
+    return {
+        "user_id": user_id,
+        "start": range_start.isoformat(),
+        "end": range_end.isoformat(),
+        "days": [d.isoformat() for d in days],
+        "rows": list(grid.values()),
+        "day_totals": [round(h, 2) for h in day_totals],
+        "total": round(sum(day_totals), 2),
+    }
+
 @app.get("/projects/{project_id}/users-and-staffing/", status_code=status.HTTP_200_OK)
-async def get_project_users(project_id: int, db: db_dependency):
+async def get_project_users(project_id: int, request: Request, response: Response, db: report_db_dependency):
+    not_modified = conditional_get(request, response, db, project_id)
+    if not_modified is not None:
+        return not_modified
     # Join Users and ProjectStaffing for the given project_id
     results = (
         db.query(models.Users, models.ProjectStaffing)
@@ -575,8 +1172,13 @@ def get_project_utilization(
     project_id: int,
     start: str,   # ISO date (any day) marking the left edge of your grid
     end: str,     # ISO date (any day) marking the right edge of your grid
-    db: db_dependency
+    request: Request,
+    response: Response,
+    db: report_db_dependency
 ):
+    not_modified = conditional_get(request, response, db, project_id)
+    if not_modified is not None:
+        return not_modified
     # 1) Resolve project span (for even spread)
     proj_row = db.query(models.Projects).filter(models.Projects.id == project_id).first()
     if not proj_row:
@@ -627,18 +1229,19 @@ def get_project_utilization(
         weeks.append(cur)
         cur += timedelta(days=7)
 
-    # 4) Get actual hours grouped by (user_id, week_start) inside the window
+    # 4) Get actual hours grouped by (user_id, work_date) inside the window.
+    #    Days are bucketed into weeks below, which keeps the SQL portable (MySQL and archive reads).
     actuals_sql = text("""
         SELECT
           te.user_id                                       AS user_id,
-          DATE_SUB(te.work_date, INTERVAL WEEKDAY(te.work_date) DAY) AS week_start,
+          te.work_date                                     AS work_date,
           SUM(te.hours)                                    AS actual_hours
         FROM time_entries te
         JOIN tasks t  ON t.id = te.task_id
         JOIN project_phases ph ON ph.id = t.phase_id
         WHERE ph.project_id = :project_id
           AND te.work_date BETWEEN :win_start AND :win_end
-        GROUP BY te.user_id, week_start
+        GROUP BY te.user_id, te.work_date
     """)
     actual_rows = db.execute(
         actuals_sql,
@@ -652,8 +1255,9 @@ def get_project_utilization(
     # Dict[(user_id, week_iso)] -> actual hours
     actual_map: Dict[tuple, float] = {}
     for r in actual_rows:
-        wk_iso = r.week_start.strftime("%Y-%m-%d") if isinstance(r.week_start, date) else str(r.week_start)
-        actual_map[(int(r.user_id), wk_iso)] = float(r.actual_hours or 0)
+        work_day = r.work_date if isinstance(r.work_date, date) else datetime.fromisoformat(str(r.work_date)).date()
+        key = (int(r.user_id), monday_of(work_day).isoformat())
+        actual_map[key] = actual_map.get(key, 0.0) + float(r.actual_hours or 0)
 
     # 5) Build rows: for each staffed user and each week in window,
     #    planned (even spread within project span) vs actual
@@ -686,51 +1290,18 @@ def get_project_utilization(
 
 # Get project's total spending across all tasks
 @app.get("/projects/{project_id}/total-spend/", status_code=status.HTTP_200_OK)
-def get_total_project_spend(project_id: int, db: Session = Depends(get_db)):
-    per_row_sql = text("""
-        SELECT
-          te.id AS time_entry_id,
-          te.task_id,
-          te.user_id,
-          te.work_date,
-          COALESCE(te.hours, 0) AS hours,
-          COALESCE(ta.hourly_rate, 0) AS hourly_rate,
-          (COALESCE(te.hours, 0) * COALESCE(ta.hourly_rate, 0)) AS line_cost
-        FROM time_entries AS te
-        JOIN tasks AS t ON te.task_id = t.id
-        JOIN task_assignments AS ta ON ta.task_id = t.id AND ta.user_id = te.user_id
-        JOIN project_phases AS ph ON t.phase_id = ph.id
-        WHERE ph.project_id = :project_id
-        ORDER BY te.work_date ASC
-    """)
-    per_rows = db.execute(per_row_sql, {"project_id": project_id}).fetchall()
-
-    rows = []
-    for r in per_rows:
-        # Build a plain dict from the SQLAlchemy Row in a robust way:
-        # prefer r._mapping, then r._asdict(), then fallback to dict(r) if available.
-        if hasattr(r, "_mapping"):
-            rd = dict(r._mapping)
-        elif hasattr(r, "_asdict"):
-            rd = dict(r._asdict())
-        else:
-            rd = dict(r)
-
-        # normalize types and formats
-        rd["hours"] = float(rd.get("hours") or 0.0)
-        rd["hourly_rate"] = float(rd.get("hourly_rate") or 0.0)
-        rd["line_cost"] = float(rd.get("line_cost") or 0.0)
-        if isinstance(rd.get("work_date"), (datetime, date)):
-            rd["work_date"] = rd["work_date"].isoformat()
-        rows.append(rd)
-
-    total_sql = text("""
+def get_total_project_spend(project_id: int, request: Request, response: Response, db: Session = Depends(get_report_db)):
+    not_modified = conditional_get(request, response, db, project_id)
+    if not_modified is not None:
+        return not_modified
+    total_sql = text(f"""
         SELECT
-          SUM(COALESCE(te.hours, 0) * COALESCE(ta.hourly_rate, 0)) AS total_project_spent
+          SUM(COALESCE(te.hours, 0) * {rate_history.rate_expr()}) AS total_project_spent
         FROM time_entries AS te
         JOIN tasks AS t ON te.task_id = t.id
         JOIN task_assignments AS ta ON ta.task_id = t.id AND ta.user_id = te.user_id
         JOIN project_phases AS ph ON t.phase_id = ph.id
+        {rate_history.rate_join(rate_history.PROJECT_SCOPE)}
         WHERE ph.project_id = :project_id
     """)
     total_row = db.execute(total_sql, {"project_id": project_id}).fetchone()
@@ -740,7 +1311,10 @@ def get_total_project_spend(project_id: int, db: Session = Depends(get_db)):
 
 #Get total forecast cost for a project
 @app.get("/projects/{project_id}/forecast-cost/", status_code=status.HTTP_200_OK)
-def get_total_forecast_cost(project_id: int, db: Session = Depends(get_db)):
+def get_total_forecast_cost(project_id: int, request: Request, response: Response, db: Session = Depends(get_report_db)):
+    not_modified = conditional_get(request, response, db, project_id)
+    if not_modified is not None:
+        return not_modified
     forecast_sql = text("""WITH calc AS (
             SELECT
                 COALESCE(hourly_rate, 0) * COALESCE(forecast_hours_initial, 0) AS calc_result
@@ -753,6 +1327,53 @@ def get_total_forecast_cost(project_id: int, db: Session = Depends(get_db)):
     total_project_forecast = float(total_row.total_project_forecast or 0.0) if total_row else 0.0
     return {"total_project_forecast": round(total_project_forecast, 2)}
 
+# Cumulative actual spend vs planned budget vs forecast over time, for the project and each phase
+@app.get("/projects/{project_id}/spend-series/", status_code=status.HTTP_200_OK)
+def get_project_spend_series(
+    project_id: int,
+    request: Request,
+    response: Response,
+    db: report_db_dependency,
+    granularity: str = Query("week", pattern="^(day|week)$"),
+):
+    not_modified = conditional_get(request, response, db, project_id)
+    if not_modified is not None:
+        return not_modified
+    project = db.query(models.Projects).filter(models.Projects.id == project_id).first()
+    if not project:
+        raise HTTPException(404, "Project not found")
+    return burn.spend_series(db, project, granularity)
+
+# What-if staffing scenarios: projected completion cost, variance vs forecast and burn-down curves.
+# Read-only, nothing is written to the database.
+@app.post("/scenarios/forecast/", status_code=status.HTTP_200_OK)
+def run_forecast_scenarios(payload: ScenarioRequest, db: Session = Depends(get_db)):
+    try:
+        as_of = datetime.fromisoformat(payload.as_of).date() if payload.as_of else None
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid 'as_of' date. Use YYYY-MM-DD.")
+
+    portfolio = load_portfolio(db, payload.project_ids)
+    scenarios = [scenario.model_dump() for scenario in payload.scenarios]
+    return {"scenarios": run_scenarios(portfolio, scenarios, as_of)}
+
+# Who is staffed above `threshold` hours/week across all their projects, and when.
+@app.get("/staffing/over-allocation/", status_code=status.HTTP_200_OK)
+def get_over_allocation(
+    db: db_dependency,
+    threshold: float = Query(40.0, description="Weekly hours considered full time"),
+    start: Optional[str] = Query(None, description="YYYY-MM-DD"),
+    end: Optional[str] = Query(None, description="YYYY-MM-DD"),
+):
+    try:
+        window_start = datetime.fromisoformat(start).date() if start else None
+        window_end = datetime.fromisoformat(end).date() if end else None
+    except Exception:
+        raise HTTPException(400, "Invalid 'start' or 'end' date. Use YYYY-MM-DD.")
+
+    intervals = staffing_intervals(db)
+    return sweep_over_allocation(intervals, threshold, window_start, window_end)
+
 # -----------------------
 # Invoicing (Section 8)
 # -----------------------
@@ -771,14 +1392,19 @@ async def create_invoice(invoice: InvoicesBase, db: db_dependency):
 @app.get("/projects/{project_id}/invoices/preview", status_code=status.HTTP_200_OK)
 def preview_invoice(
     project_id: int,
+    request: Request,
+    response: Response,
     period_start: str = Query(..., description="YYYY-MM-DD"),
     period_end: str = Query(..., description="YYYY-MM-DD"),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_report_db),
 ):
     """
     Sums billable hours × rate per (task, phase) for the given period.
     Returns rows and a total.
     """
+    not_modified = conditional_get(request, response, db, project_id)
+    if not_modified is not None:
+        return not_modified
     # Validate basic date strings (you are storing dates as strings)
     try:
         _ = datetime.fromisoformat(period_start)
@@ -786,29 +1412,24 @@ def preview_invoice(
     except Exception:
         raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD.")
 
-    sql = text("""
+    # Closed months come from billing_snapshots, only the open days scan time_entries
+    covered, raw_ranges = period_close.split_period(db, project_id, period_start, period_end)
+    lines_sql, params, binds = period_close.billing_lines_sql(covered, raw_ranges)
+    sql = text(f"""
         SELECT
           t.id                  AS task_id,
           t.title               AS task_title,
           ph.phase_name         AS phase_name,
-          SUM(CASE WHEN te.is_billable THEN COALESCE(te.hours,0) ELSE 0 END) AS hours,
-          -- Pick the first (or any) rate on the task for the user/time; if different users have different rates,
-          -- we compute per-user then sum amounts below.
-          SUM(CASE WHEN te.is_billable THEN COALESCE(te.hours,0) * COALESCE(ta.hourly_rate,0) ELSE 0 END) AS amount
-        FROM tasks t
+          SUM(bl.billable_hours)           AS hours,
+          -- per-user rates are applied line by line, then summed per task
+          SUM(bl.billable_hours * bl.rate) AS amount
+        FROM ({lines_sql}) AS bl
+        JOIN tasks t ON t.id = bl.task_id
         JOIN project_phases ph ON ph.id = t.phase_id
-        LEFT JOIN time_entries te ON te.task_id = t.id
-        LEFT JOIN task_assignments ta ON ta.task_id = t.id AND ta.user_id = te.user_id
-        WHERE ph.project_id = :project_id
-          AND te.work_date BETWEEN :start AND :end
         GROUP BY t.id, t.title, ph.phase_name
         ORDER BY ph.phase_name, t.title
-    """)
-    rows = db.execute(sql, {
-        "project_id": project_id,
-        "start": period_start,
-        "end": period_end
-    }).fetchall()
+    """).bindparams(*binds)
+    rows = db.execute(sql, {"project_id": project_id, **params}).fetchall()
 
     items = []
     total = 0.0
@@ -869,22 +1490,14 @@ def generate_invoice(
     if not proj:
         raise HTTPException(status_code=404, detail="Project not found")
 
-    # Compute total: sum of billable hours * rate within period
-    total_sql = text("""
-        SELECT
-          SUM(CASE WHEN te.is_billable THEN COALESCE(te.hours,0) * COALESCE(ta.hourly_rate,0) ELSE 0 END) AS total_amount
-        FROM time_entries te
-        JOIN tasks t  ON t.id = te.task_id
-        JOIN project_phases ph ON ph.id = t.phase_id
-        LEFT JOIN task_assignments ta ON ta.task_id = t.id AND ta.user_id = te.user_id
-        WHERE ph.project_id = :project_id
-          AND te.work_date BETWEEN :start AND :end
-    """)
-    total_row = db.execute(total_sql, {
-        "project_id": project_id,
-        "start": period_start,
-        "end": period_end,
-    }).fetchone()
+    # Compute total: sum of billable hours * rate within period (closed months from snapshots)
+    covered, raw_ranges = period_close.split_period(db, project_id, period_start, period_end)
+    lines_sql, params, binds = period_close.billing_lines_sql(covered, raw_ranges)
+    total_sql = text(f"""
+        SELECT SUM(bl.billable_hours * bl.rate) AS total_amount
+        FROM ({lines_sql}) AS bl
+    """).bindparams(*binds)
+    total_row = db.execute(total_sql, {"project_id": project_id, **params}).fetchone()
 
     total_amount = float(total_row.total_amount or 0.0)
 
@@ -908,13 +1521,8 @@ def generate_invoice(
         "total_amount": inv.total_amount,
     }
 
-@app.delete("/projects/{project_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_project(project_id: int, db: Session = Depends(get_db)):
-    # Ensure project exists
-    project = db.query(models.Projects).filter(models.Projects.id == project_id).first()
-    if not project:
-        raise HTTPException(status_code=404, detail="Project not found")
-
+# Deletes a project and its whole subtree (caller commits). Used by delete and archive.
+def delete_project_rows(db: Session, project_id: int) -> None:
     # Collect phase IDs for this project
     phase_ids = [pid for (pid,) in db.query(models.ProjectPhases.id)
                  .filter(models.ProjectPhases.project_id == project_id)
@@ -932,10 +1540,12 @@ def delete_project(project_id: int, db: Session = Depends(get_db)):
         db.query(models.TimeEntries).filter(models.TimeEntries.task_id.in_(task_ids)) \
           .delete(synchronize_session=False)
 
-    # 2) Delete task assignments tied to tasks
+    # 2) Delete task assignments (and their rate history) tied to tasks
     if task_ids:
         db.query(models.TaskAssignments).filter(models.TaskAssignments.task_id.in_(task_ids)) \
           .delete(synchronize_session=False)
+        db.query(models.TaskAssignmentRates).filter(models.TaskAssignmentRates.task_id.in_(task_ids)) \
+          .delete(synchronize_session=False)
 
     # 3) Delete tasks
     if task_ids:
@@ -955,20 +1565,68 @@ def delete_project(project_id: int, db: Session = Depends(get_db)):
     db.query(models.Invoices).filter(models.Invoices.project_id == project_id) \
       .delete(synchronize_session=False)
 
-    # 7) Finally, delete the project
+    # 7) Delete billing snapshots and period closes for this project
+    db.query(models.BillingSnapshots).filter(models.BillingSnapshots.project_id == project_id) \
+      .delete(synchronize_session=False)
+    db.query(models.PeriodCloses).filter(models.PeriodCloses.project_id == project_id) \
+      .delete(synchronize_session=False)
+
+    # 8) Finally, delete the project
     db.query(models.Projects).filter(models.Projects.id == project_id) \
       .delete(synchronize_session=False)
 
+@app.delete("/projects/{project_id}", status_code=status.HTTP_204_NO_CONTENT)
+def delete_project(project_id: int, db: Session = Depends(get_db)):
+    # Ensure project exists
+    project = db.query(models.Projects).filter(models.Projects.id == project_id).first()
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+
+    delete_project_rows(db, project_id)
     db.commit()
+    search_index.remove_project(project_id)
+    timeline.remove_project(project_id)
     return  # 204 No Content
 
+# Start a new project from an existing one (template): phases, tasks, staffing and optionally
+# task assignments are copied set-based with every date shifted to the new start date.
+@app.post("/projects/{project_id}/clone", status_code=status.HTTP_201_CREATED)
+def clone_project(project_id: int, payload: ProjectCloneRequest, db: db_dependency):
+    source = db.query(models.Projects).filter(models.Projects.id == project_id).first()
+    if not source:
+        raise HTTPException(status_code=404, detail="Project not found")
+    try:
+        datetime.fromisoformat(payload.start_date)
+        datetime.fromisoformat(str(source.start_date))
+    except Exception:
+        raise HTTPException(400, "start_date and the source project's start_date must be YYYY-MM-DD")
+
+    result = project_clone.clone_project(
+        db,
+        source,
+        name=payload.name,
+        client_name=payload.client_name,
+        start_date=payload.start_date,
+        include_staffing=payload.include_staffing,
+        include_assignments=payload.include_assignments,
+    )
+    new_project_id = result["project_id"]
+    search_index.index_project_subtree(db, new_project_id)
+    timeline.refresh_project(db, new_project_id)
+    return result
+
 @app.get("/projects/{project_id}/invoice-table/", status_code=status.HTTP_200_OK)
 def get_invoice_table(
     project_id: int,
+    request: Request,
+    response: Response,
     start_date: str = Query(..., description="YYYY-MM-DD"),
     end_date: str = Query(..., description="YYYY-MM-DD"),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_report_db),
 ):
+    not_modified = conditional_get(request, response, db, project_id)
+    if not_modified is not None:
+        return not_modified
     # validate date strings
     try:
         _ = datetime.fromisoformat(start_date)
@@ -976,23 +1634,20 @@ def get_invoice_table(
     except Exception:
         raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD.")
 
-    # 1) Aggregate hours per (task_id, user_id) inside the period.
-    #    This produces the raw numbers we will enrich with task/phase/user/rate info.
-    hours_agg_sql = """
-        SELECT
-            te.task_id   AS task_id,
-            te.user_id   AS user_id,
-            SUM(te.hours) AS hours
-        FROM time_entries te
-        JOIN tasks t ON te.task_id = t.id
-        JOIN project_phases ph ON t.phase_id = ph.id
-        WHERE ph.project_id = :project_id
-          AND te.work_date BETWEEN :start AND :end
-        GROUP BY te.task_id, te.user_id
-    """
+    return build_invoice_table(db, project_id, start_date, end_date)
 
-    # 2) Build the final query by joining the aggregated hours to task, phase, user and
-    #    left-joining to task_assignments to obtain the hourly rate (if present)
+# Invoice table rows (Task, Phase, Contributor, Hours, Rate, Amount) for a period.
+# Shared by the invoice-table endpoint (all hours) and invoice documents (billable hours only,
+# the same figure generate_invoice stores as the invoice total).
+def build_invoice_table(db: Session, project_id: int, start_date: str, end_date: str, billable_only: bool = False) -> Dict[str, Any]:
+    # 1) Hours per (task_id, user_id, rate) inside the period: closed months come from
+    #    billing_snapshots (rates frozen at close), open days are aggregated from time_entries.
+    covered, raw_ranges = period_close.split_period(db, project_id, start_date, end_date)
+    lines_sql, params, binds = period_close.billing_lines_sql(covered, raw_ranges)
+
+    # 2) Enrich the aggregated lines with task, phase and user info
+    hours_column = "billable_hours" if billable_only else "hours"
+    having = f"HAVING SUM(bl.{hours_column}) > 0" if billable_only else ""
     sql = text(f"""
         SELECT
             agg.task_id          AS task_id,
@@ -1001,18 +1656,20 @@ def get_invoice_table(
             u.id                 AS user_id,
             u.name               AS user_name,
             agg.hours            AS hours,
-            COALESCE(ta.hourly_rate, 0) AS rate
+            agg.rate             AS rate
         FROM (
-            {hours_agg_sql}
+            SELECT bl.task_id, bl.user_id, bl.rate, SUM(bl.{hours_column}) AS hours
+            FROM ({lines_sql}) AS bl
+            GROUP BY bl.task_id, bl.user_id, bl.rate
+            {having}
         ) AS agg
         JOIN tasks t ON t.id = agg.task_id
         JOIN project_phases ph ON ph.id = t.phase_id
-        LEFT JOIN task_assignments ta ON ta.task_id = agg.task_id AND ta.user_id = agg.user_id
         JOIN users u ON u.id = agg.user_id
         ORDER BY ph.phase_name, t.title, u.name
-    """)
+    """).bindparams(*binds)
 
-    rows = db.execute(sql, {"project_id": project_id, "start": start_date, "end": end_date}).fetchall()
+    rows = db.execute(sql, {"project_id": project_id, **params}).fetchall()
 
     items = []
     total_amount = 0.0
@@ -1032,4 +1689,226 @@ def get_invoice_table(
             "amount": amount,
         })
 
-    return {"rows": items, "total_amount": round(total_amount, 2)}
\ No newline at end of file
+    return {"rows": items, "total_amount": round(total_amount, 2)}
+
+# -----------------------
+# Invoice documents (CSV / XLSX / PDF), rendered on a process pool
+# -----------------------
+
+def load_invoice_document(db: Session, invoice: models.Invoices) -> Dict[str, Any]:
+    table = build_invoice_table(db, invoice.project_id, invoice.period_start, invoice.period_end, billable_only=True)
+    return {
+        "id": invoice.id,
+        "project_id": invoice.project_id,
+        "client_name": invoice.client_name,
+        "period_start": invoice.period_start,
+        "period_end": invoice.period_end,
+        "rows": table["rows"],
+        "total_amount": invoice.total_amount,  # the stored invoice figure, not a recomputation
+    }
+
+def validate_render_format(fmt: str) -> str:
+    fmt = fmt.lower()
+    if fmt not in invoice_render.FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format. Use one of: {', '.join(invoice_render.FORMATS)}.")
+    return fmt
+
+# Queue rendering of one invoice; returns 202 with a job to poll.
+@app.post("/invoices/{invoice_id}/render", status_code=status.HTTP_202_ACCEPTED)
+def render_invoice(
+    invoice_id: int,
+    db: db_dependency,
+    format: str = Query("pdf", description="csv | xlsx | pdf"),
+    force: bool = Query(False, description="Re-render even if a cached file exists"),
+):
+    fmt = validate_render_format(format)
+    invoice = db.query(models.Invoices).filter(models.Invoices.id == invoice_id).first()
+    if not invoice:
+        raise HTTPException(status_code=404, detail="Invoice not found")
+    return invoice_render.submit(load_invoice_document(db, invoice), fmt, force)
+
+# Render every invoice of a month, all formats in parallel on the pool.
+@app.post("/invoices/render-batch", status_code=status.HTTP_202_ACCEPTED)
+def render_invoice_batch(payload: InvoiceRenderBatch, db: db_dependency):
+    try:
+        month = period_close.normalize_month(payload.month)  # '2024-1' would also match 2024-10..12
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid month. Use YYYY-MM.")
+    formats = [validate_render_format(fmt) for fmt in payload.formats]
+
+    invoices = db.query(models.Invoices).filter(models.Invoices.period_start.like(f"{month}-%")).all()
+    jobs = []
+    for invoice in invoices:
+        document = load_invoice_document(db, invoice)
+        for fmt in formats:
+            jobs.append(invoice_render.submit(document, fmt, payload.force))
+    return {"month": month, "jobs": jobs}
+
+@app.get("/invoices/render-jobs/{job_id}", status_code=status.HTTP_200_OK)
+def get_render_job(job_id: str):
+    job = invoice_render.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Render job not found")
+    return job
+
+# Download a rendered invoice document from the local cache.
+# 404 when it was never rendered or the invoice/its entries changed since (render it again).
+@app.get("/invoices/{invoice_id}/document", status_code=status.HTTP_200_OK)
+def get_invoice_document(invoice_id: int, db: db_dependency, format: str = Query("pdf", description="csv | xlsx | pdf")):
+    fmt = validate_render_format(format)
+    invoice = db.query(models.Invoices).filter(models.Invoices.id == invoice_id).first()
+    if not invoice:
+        raise HTTPException(status_code=404, detail="Invoice not found")
+    path = invoice_render.document_path(load_invoice_document(db, invoice), fmt)
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Invoice document not rendered yet")
+    return FileResponse(path, filename=f"invoice_{invoice_id}.{fmt}")
+
+# Depth and lag of the background recompute queue
+@app.get("/metrics/recompute-queue", status_code=status.HTTP_200_OK)
+def get_recompute_queue_metrics():
+    return recompute_queue.metrics()
+
+@app.get("/metrics/time-entry-group-commit", status_code=status.HTTP_200_OK)
+def get_group_commit_metrics():
+    return group_commit.metrics()
+
+# Active, waiting and shed requests per workload class
+@app.get("/metrics/admission", status_code=status.HTTP_200_OK)
+def get_admission_metrics():
+    return admission.metrics()
+
+# -----------------------
+# Delta sync
+# -----------------------
+
+# Rows inserted/updated/deleted since a client's last sequence number, oldest first.
+# Start with since=0 (full sync), then pass back next_since until has_more is false.
+@app.get("/sync/changes", status_code=status.HTTP_200_OK)
+def get_changes(
+    db: db_dependency,
+    since: int = Query(0, ge=0),
+    limit: int = Query(500, ge=1, le=5000),
+    tables: Optional[str] = Query(None, description="Comma-separated, e.g. projects,tasks"),
+):
+    table_list = [t.strip() for t in tables.split(",") if t.strip()] if tables else None
+    unknown = [t for t in table_list or [] if t not in changes.SYNCED_TABLES]
+    if unknown:
+        raise HTTPException(400, f"Unknown table(s): {', '.join(unknown)}. Allowed: {', '.join(changes.SYNCED_TABLES)}")
+    return row_json.FastJSONResponse(changes.changes_since(db, since, limit, table_list))
+
+# -----------------------
+# Reconciliation of derived figures (task actual spend, staffing remaining hours)
+# -----------------------
+
+@app.post("/reconcile/", status_code=status.HTTP_200_OK)
+def run_reconciliation(dry_run: bool = Query(False, description="Only report drift, change nothing")):
+    return reconcile.run_now(dry_run=dry_run)
+
+@app.get("/reconcile/last", status_code=status.HTTP_200_OK)
+def get_last_reconciliation():
+    report = reconcile.last_report()
+    if report is None:
+        raise HTTPException(404, "No reconciliation has run since startup")
+    return report
+
+# -----------------------
+# Request profiles
+# -----------------------
+
+@app.get("/profiles/", status_code=status.HTTP_200_OK)
+def get_profiles(
+    route: Optional[str] = Query(None, description="Route template, e.g. /projects/{project_id}/invoice-table"),
+    limit: int = Query(50, ge=1, le=500),
+):
+    return {"enabled": profiling.ENABLED, "profiles": profiling.list_profiles(route, limit)}
+
+@app.get("/profiles/{profile_id}", status_code=status.HTTP_200_OK)
+def get_profile(profile_id: str, format: str = Query("json", pattern="^(json|folded)$")):
+    profile = profiling.load_profile(profile_id)
+    if profile is None:
+        raise HTTPException(404, "Profile not found")
+    if format == "folded":
+        return PlainTextResponse(profiling.folded(profile))
+    return profile
+
+# -----------------------
+# Period close (monthly billing snapshots)
+# -----------------------
+
+@app.get("/projects/{project_id}/period-close/", status_code=status.HTTP_200_OK)
+def get_closed_periods(project_id: int, db: report_db_dependency):
+    return {"project_id": project_id, "closed_months": period_close.closed_months(db, project_id)}
+
+# Freeze one month of billable hours/amounts for the project
+@app.post("/projects/{project_id}/period-close/", status_code=status.HTTP_201_CREATED)
+def close_project_period(project_id: int, payload: PeriodCloseRequest, db: db_dependency):
+    try:
+        month = period_close.normalize_month(payload.month)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid month. Use YYYY-MM.")
+    if not db.query(models.Projects).filter(models.Projects.id == project_id).first():
+        raise HTTPException(status_code=404, detail="Project not found")
+
+    snapshot_rows = period_close.close_period(db, project_id, month)
+    return {"project_id": project_id, "month": month, "snapshot_rows": snapshot_rows}
+
+@app.delete("/projects/{project_id}/period-close/{month}", status_code=status.HTTP_204_NO_CONTENT)
+def reopen_project_period(project_id: int, month: str, db: db_dependency):
+    try:
+        month = period_close.normalize_month(month)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid month. Use YYYY-MM.")
+    period_close.reopen_period(db, project_id, month)
+    return  # 204 No Content
+
+# -----------------------
+# Cold-storage archive (Parquet) for finished projects
+# -----------------------
+
+@app.get("/archives/", status_code=status.HTTP_200_OK)
+def get_archives():
+    if not os.path.isdir(archive.ARCHIVE_DIR):
+        return []
+    manifests = []
+    for name in sorted(os.listdir(archive.ARCHIVE_DIR)):
+        if name.startswith("project_") and not name.endswith(".tmp"):
+            manifest = archive.read_manifest(int(name[len("project_"):]))
+            if manifest:
+                manifests.append(manifest)
+    return manifests
+
+# Export a finished project's subtree to Parquet and remove it from MySQL
+@app.post("/projects/{project_id}/archive", status_code=status.HTTP_201_CREATED)
+def archive_project(project_id: int, db: db_dependency, force: bool = Query(False)):
+    project = db.query(models.Projects).filter(models.Projects.id == project_id).first()
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+    if archive.is_archived(project_id):
+        raise HTTPException(status_code=409, detail="Project is already archived")
+    try:
+        finished = datetime.fromisoformat(str(project.end_date)).date() < date.today()
+    except Exception:
+        finished = False
+    if not finished and not force:
+        raise HTTPException(status_code=409, detail="Only finished projects can be archived (use force=true to override)")
+
+    manifest = archive.archive_project(db, project_id)
+    delete_project_rows(db, project_id)
+    db.commit()
+    search_index.remove_project(project_id)
+    timeline.remove_project(project_id)
+    return manifest
+
+# Bring an archived project back into MySQL
+@app.post("/projects/{project_id}/restore", status_code=status.HTTP_200_OK)
+def restore_project(project_id: int, db: db_dependency):
+    if not archive.is_archived(project_id):
+        raise HTTPException(status_code=404, detail="Archived project not found")
+    if db.query(models.Projects.id).filter(models.Projects.id == project_id).first():
+        raise HTTPException(status_code=409, detail="Project already exists in the database")
+
+    row_counts = archive.restore_project(db, project_id)
+    search_index.index_project_subtree(db, project_id)
+    timeline.refresh_project(db, project_id)
+    return {"project_id": project_id, "row_counts": row_counts}
@@ -1,4 +1,4 @@
-from sqlalchemy import Boolean, Column, Integer, String, ForeignKey
+from sqlalchemy import Boolean, Column, Float, Index, Integer, String, ForeignKey, UniqueConstraint
 from sqlalchemy.orm import Mapped, mapped_column
 from database import Base
 
@@ -69,6 +69,19 @@ class TaskAssignments(Base):
     user_id = Column(Integer, index=True)  # Foreign key to Users.id
     hourly_rate = Column(Integer)
     
+class TaskAssignmentRates(Base):
+    __tablename__ = "task_assignment_rates"
+    
+    # Effective-dated rate history for a (task, user) assignment; a rate applies from
+    # effective_from until the next row's effective_from.
+    id = Column(Integer, primary_key=True, index=True)
+    task_id = Column(Integer)                 # Foreign key to Tasks.id
+    user_id = Column(Integer)                 # Foreign key to Users.id
+    hourly_rate = Column(Integer)
+    effective_from = Column(String(10))       # 'YYYY-MM-DD'
+    
+    __table_args__ = (Index("ix_task_assignment_rates_lookup", "task_id", "user_id", "effective_from"),)
+    
 class TimeEntries(Base):
     __tablename__ = "time_entries"
     
@@ -87,4 +100,46 @@ class Invoices(Base):
     client_name = Column(String(100), index=True)
     period_start = Column(String(200), index=True)  # Storing dates as strings for simplicity
     period_end = Column(String(200), index=True)    # Storing dates as strings for simplicity
-    total_amount = Column(Integer)
\ No newline at end of file
+    total_amount = Column(Integer)
+    
+class PeriodCloses(Base):
+    __tablename__ = "period_closes"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    project_id = Column(Integer, index=True)  # Foreign key to Projects.id
+    month = Column(String(7), index=True)     # 'YYYY-MM'
+    closed_at = Column(String(200))           # Storing dates as strings for simplicity
+    
+    __table_args__ = (UniqueConstraint("project_id", "month", name="uq_period_closes_project_month"),)
+    
+class BillingSnapshots(Base):
+    __tablename__ = "billing_snapshots"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    project_id = Column(Integer)              # Foreign key to Projects.id
+    task_id = Column(Integer, index=True)     # Foreign key to Tasks.id
+    user_id = Column(Integer, index=True)     # Foreign key to Users.id
+    month = Column(String(7))                 # 'YYYY-MM' of the closed period
+    hours = Column(Float, default=0)          # All hours logged in the month
+    billable_hours = Column(Float, default=0)
+    hourly_rate = Column(Float, default=0)    # Rate frozen at close time
+    amount = Column(Float, default=0)         # billable_hours * hourly_rate
+    
+    __table_args__ = (Index("ix_billing_snapshots_project_month", "project_id", "month"),)
+    
+class ChangeLog(Base):
+    __tablename__ = "change_log"
+    
+    # id doubles as the change sequence number; REPLACE gives a changed row a new, higher id,
+    # so the log holds at most one entry (the latest change) per row.
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    table_name = Column(String(32))
+    row_id = Column(Integer)
+    op = Column(String(6))                    # 'upsert' or 'delete'
+    changed_at = Column(String(200))          # Storing dates as strings for simplicity
+    project_id = Column(Integer)              # project the row belongs to (0: every project), for ETags
+    
+    __table_args__ = (
+        UniqueConstraint("table_name", "row_id", name="uq_change_log_row"),
+        Index("ix_change_log_project", "project_id", "id"),
+    )
@@ -0,0 +1,183 @@
+from datetime import date, datetime, timedelta
+from typing import List, Tuple, Dict, Any, Optional
+
+from sqlalchemy import text, bindparam
+from sqlalchemy.orm import Session
+
+import models
+import rate_history
+
+# Monthly period close: freezes per-(project, task, user, month) hours and amounts into
+# billing_snapshots. Billing range queries then sum closed-month snapshots and only scan
+# raw time_entries for the days that are not covered by a closed month.
+
+
+def normalize_month(month: str) -> str:
+    """Canonical 'YYYY-MM' (strptime also accepts '2024-1'); every stored/looked-up month uses it."""
+    return datetime.strptime(month, "%Y-%m").strftime("%Y-%m")
+
+
+def month_bounds(month: str) -> Tuple[date, date]:
+    first = datetime.strptime(month, "%Y-%m").date()
+    next_first = (first.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return first, next_first - timedelta(days=1)
+
+
+def closed_months(db: Session, project_id: int) -> List[str]:
+    rows = db.query(models.PeriodCloses.month).filter(models.PeriodCloses.project_id == project_id).all()
+    return sorted(month for (month,) in rows)
+
+
+def project_and_closed(db: Session, task_id: int, work_date: str) -> Tuple[Optional[int], bool]:
+    """(project id of the task, whether work_date's month is closed for it) in one query."""
+    row = db.execute(text("""
+        SELECT ph.project_id AS project_id, pc.id AS close_id
+        FROM tasks t
+        JOIN project_phases ph ON ph.id = t.phase_id
+        LEFT JOIN period_closes pc ON pc.project_id = ph.project_id AND pc.month = :month
+        WHERE t.id = :task_id
+        LIMIT 1
+    """), {"task_id": task_id, "month": str(work_date)[:7]}).fetchone()
+    if row is None:
+        return None, False
+    return row.project_id, row.close_id is not None
+
+
+def split_period(db: Session, project_id: int, start: str, end: str) -> Tuple[List[str], List[Tuple[str, str]]]:
+    """
+    Splits [start, end] into closed months fully inside the range (answered from snapshots)
+    and the contiguous raw date ranges left over (answered from time_entries).
+    """
+    start_d = datetime.fromisoformat(start).date()
+    end_d = datetime.fromisoformat(end).date()
+
+    covered: List[str] = []
+    for month in closed_months(db, project_id):
+        first, last = month_bounds(month)
+        if start_d <= first and last <= end_d:
+            covered.append(month)
+
+    raw_ranges: List[Tuple[str, str]] = []
+    cursor = start_d
+    for month in covered:  # sorted, non-overlapping
+        first, last = month_bounds(month)
+        if cursor < first:
+            raw_ranges.append((cursor.isoformat(), (first - timedelta(days=1)).isoformat()))
+        cursor = last + timedelta(days=1)
+    if cursor <= end_d:
+        raw_ranges.append((cursor.isoformat(), end_d.isoformat()))
+    return covered, raw_ranges
+
+
+def billing_lines_sql(covered: List[str], raw_ranges: List[Tuple[str, str]]) -> Tuple[str, Dict[str, Any], list]:
+    """
+    SQL for a derived table of billing lines (task_id, user_id, hours, billable_hours, rate)
+    over a split period, plus its parameters and the expanding bind params it needs.
+    Raw ranges are OR-ed BETWEEN clauses so the work_date index still applies. Raw hours are
+    priced at the rate in effect on their work_date, so a pair can yield one line per rate.
+    """
+    params: Dict[str, Any] = {"closed_months": covered}
+    range_clauses = []
+    for i, (range_start, range_end) in enumerate(raw_ranges):
+        params[f"raw_start_{i}"] = range_start
+        params[f"raw_end_{i}"] = range_end
+        range_clauses.append(f"te.work_date BETWEEN :raw_start_{i} AND :raw_end_{i}")
+    raw_filter = " OR ".join(range_clauses) if range_clauses else "1 = 0"
+
+    sql = f"""
+        SELECT s.task_id, s.user_id, s.hours, s.billable_hours, s.hourly_rate AS rate
+        FROM billing_snapshots s
+        WHERE s.project_id = :project_id
+          AND s.month IN :closed_months
+        UNION ALL
+        SELECT
+          e.task_id                                                       AS task_id,
+          e.user_id                                                       AS user_id,
+          SUM(e.hours)                                                    AS hours,
+          SUM(CASE WHEN e.is_billable THEN e.hours ELSE 0 END)            AS billable_hours,
+          e.rate                                                          AS rate
+        FROM (
+            SELECT te.task_id, te.user_id, te.is_billable, COALESCE(te.hours, 0) AS hours,
+                   {rate_history.rate_expr()} AS rate
+            FROM time_entries te
+            JOIN tasks t ON t.id = te.task_id
+            JOIN project_phases ph ON ph.id = t.phase_id
+            LEFT JOIN task_assignments ta ON ta.task_id = te.task_id AND ta.user_id = te.user_id
+            {rate_history.rate_join(rate_history.PROJECT_SCOPE)}
+            WHERE ph.project_id = :project_id
+              AND ({raw_filter})
+        ) AS e
+        GROUP BY e.task_id, e.user_id, e.rate
+    """
+    return sql, params, [bindparam("closed_months", expanding=True)]
+
+
+def close_period(db: Session, project_id: int, month: str) -> int:
+    """Freezes one month of billable figures for a project. Re-closing a month refreshes it."""
+    month = normalize_month(month)
+    first, last = month_bounds(month)
+
+    db.query(models.BillingSnapshots).filter(
+        models.BillingSnapshots.project_id == project_id,
+        models.BillingSnapshots.month == month,
+    ).delete(synchronize_session=False)
+
+    snapshot_sql = text(f"""
+        INSERT INTO billing_snapshots
+          (project_id, task_id, user_id, month, hours, billable_hours, hourly_rate, amount)
+        SELECT
+          e.project_id,
+          e.task_id,
+          e.user_id,
+          :month,
+          SUM(e.hours),
+          SUM(CASE WHEN e.is_billable THEN e.hours ELSE 0 END),
+          e.rate,
+          SUM(CASE WHEN e.is_billable THEN e.hours ELSE 0 END) * e.rate
+        FROM (
+            SELECT ph.project_id, te.task_id, te.user_id, te.is_billable, COALESCE(te.hours, 0) AS hours,
+                   {rate_history.rate_expr()} AS rate
+            FROM time_entries te
+            JOIN tasks t ON t.id = te.task_id
+            JOIN project_phases ph ON ph.id = t.phase_id
+            LEFT JOIN task_assignments ta ON ta.task_id = te.task_id AND ta.user_id = te.user_id
+            {rate_history.rate_join(rate_history.PROJECT_SCOPE)}
+            WHERE ph.project_id = :project_id
+              AND te.work_date BETWEEN :start AND :end
+        ) AS e
+        GROUP BY e.project_id, e.task_id, e.user_id, e.rate
+    """)
+    result = db.execute(snapshot_sql, {
+        "project_id": project_id,
+        "month": month,
+        "start": first.isoformat(),
+        "end": last.isoformat(),
+    })
+
+    existing = db.query(models.PeriodCloses).filter(
+        models.PeriodCloses.project_id == project_id,
+        models.PeriodCloses.month == month,
+    ).first()
+    if existing:
+        existing.closed_at = datetime.now().isoformat(timespec="seconds")
+    else:
+        db.add(models.PeriodCloses(
+            project_id=project_id,
+            month=month,
+            closed_at=datetime.now().isoformat(timespec="seconds"),
+        ))
+    db.commit()
+    return result.rowcount
+
+
+def reopen_period(db: Session, project_id: int, month: str) -> None:
+    month = normalize_month(month)
+    db.query(models.BillingSnapshots).filter(
+        models.BillingSnapshots.project_id == project_id,
+        models.BillingSnapshots.month == month,
+    ).delete(synchronize_session=False)
+    db.query(models.PeriodCloses).filter(
+        models.PeriodCloses.project_id == project_id,
+        models.PeriodCloses.month == month,
+    ).delete(synchronize_session=False)
+    db.commit()
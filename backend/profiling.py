@@ -0,0 +1,282 @@
+import functools
+import inspect
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Set
+
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+
+# On-demand request profiling (off unless PROFILING_ENABLED=1).
+#
+# A profiled request gets a statistical stack sampler: every SAMPLE_INTERVAL seconds a background
+# thread grabs the current stack of the event loop thread (routing, validation, serialization) and
+# of the worker thread running the sync endpoint, and counts them as collapsed stacks
+# ("outer;inner;leaf" -> samples), which is what flame graph tools read. SQL time and statement
+# count are measured separately through engine events.
+# Note: the event loop thread is shared, so concurrent requests can show up in its samples.
+#
+# A request is profiled when it sends "X-Profile: 1" (or the PROFILING_TOKEN value, if set),
+# or at random with probability PROFILING_SAMPLE_RATE.
+# Profiles are written to profiles/<id>.json; only the newest MAX_PROFILES are kept.
+
+ENABLED = os.environ.get("PROFILING_ENABLED", "0") == "1"
+SAMPLE_RATE = float(os.environ.get("PROFILING_SAMPLE_RATE", "0"))
+TOKEN = os.environ.get("PROFILING_TOKEN")
+SAMPLE_INTERVAL = 0.005
+MAX_PROFILES = 500
+PROFILE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "profiles")
+SKIP_SUFFIXES = ("/events",)  # SSE streams never finish
+
+_current: ContextVar[Optional["Profile"]] = ContextVar("profile", default=None)
+
+
+class Profile:
+    def __init__(self, loop_thread: int) -> None:
+        self.id = datetime.now().strftime("%Y%m%dT%H%M%S") + "-" + uuid.uuid4().hex[:8]
+        self.lock = threading.Lock()
+        self.threads: Set[int] = {loop_thread}
+        self.stacks: Dict[str, int] = {}
+        self.samples = 0
+        self.sql_seconds = 0.0
+        self.sql_count = 0
+
+    def attach(self, thread_id: int) -> None:
+        with self.lock:
+            self.threads.add(thread_id)
+
+    def detach(self, thread_id: int) -> None:
+        with self.lock:
+            self.threads.discard(thread_id)
+
+    def record(self, frames: Dict[int, Any]) -> None:
+        with self.lock:
+            threads = list(self.threads)
+        for thread_id in threads:
+            frame = frames.get(thread_id)
+            if frame is None or _is_idle(frame):
+                continue
+            stack = _collapse(frame)
+            with self.lock:
+                self.stacks[stack] = self.stacks.get(stack, 0) + 1
+                self.samples += 1
+
+
+def _is_idle(frame) -> bool:
+    # The event loop waiting in select() between callbacks is not work done for this request
+    return os.path.basename(frame.f_code.co_filename) == "selectors.py"
+
+
+def _collapse(frame) -> str:
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class _Sampler:
+    """One sampling thread, running only while at least one profile is active."""
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.active: Set[Profile] = set()
+        self.thread: Optional[threading.Thread] = None
+
+    def add(self, profile: Profile) -> None:
+        with self.lock:
+            self.active.add(profile)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+                self.thread.start()
+
+    def remove(self, profile: Profile) -> None:
+        with self.lock:
+            self.active.discard(profile)
+
+    def _run(self) -> None:
+        me = threading.get_ident()
+        while True:
+            with self.lock:
+                if not self.active:
+                    self.thread = None
+                    return
+                profiles = list(self.active)
+            frames = {k: v for k, v in sys._current_frames().items() if k != me}
+            for profile in profiles:
+                profile.record(frames)
+            del frames
+            time.sleep(SAMPLE_INTERVAL)
+
+
+_sampler = _Sampler()
+
+
+def _track_thread(endpoint):
+    # Sync endpoints run in the threadpool; register that thread with the request's profile
+    @functools.wraps(endpoint)
+    def wrapper(*args, **kwargs):
+        profile = _current.get()
+        if profile is None:
+            return endpoint(*args, **kwargs)
+        thread_id = threading.get_ident()
+        profile.attach(thread_id)
+        try:
+            return endpoint(*args, **kwargs)
+        finally:
+            profile.detach(thread_id)
+    return wrapper
+
+
+class ProfiledRoute(APIRoute):
+    def __init__(self, path: str, endpoint, **kwargs) -> None:
+        if not inspect.iscoroutinefunction(endpoint):
+            endpoint = _track_thread(endpoint)
+        super().__init__(path, endpoint, **kwargs)
+
+
+def install_sql_timing(engine) -> None:
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if _current.get() is not None:
+            conn.info.setdefault("profile_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        profile = _current.get()
+        starts = conn.info.get("profile_start")
+        if profile is None or not starts:
+            return
+        elapsed = time.perf_counter() - starts.pop()
+        with profile.lock:
+            profile.sql_seconds += elapsed
+            profile.sql_count += 1
+
+
+def _should_profile(scope) -> bool:
+    if scope["path"].endswith(SKIP_SUFFIXES) or scope["path"].startswith("/profiles"):
+        return False
+    for name, value in scope.get("headers", []):
+        if name == b"x-profile":
+            return value.decode() == (TOKEN or "1")
+    return SAMPLE_RATE > 0 and random.random() < SAMPLE_RATE
+
+
+class ProfilingMiddleware:
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not _should_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        profile = Profile(threading.get_ident())
+        token = _current.set(profile)
+        status_code = 500
+
+        async def send_with_id(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(b"x-profile-id", profile.id.encode())]
+            await send(message)
+
+        _sampler.add(profile)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            duration = time.perf_counter() - started
+            _sampler.remove(profile)
+            _current.reset(token)
+            _save(profile, scope, status_code, duration)
+
+
+def _route_template(scope) -> Optional[str]:
+    route = scope.get("route")
+    if route is not None:
+        return getattr(route, "path", None)
+    endpoint = scope.get("endpoint")
+    return getattr(endpoint, "__name__", None)
+
+
+def _save(profile: Profile, scope, status_code: int, duration: float) -> None:
+    with profile.lock:
+        stacks = dict(profile.stacks)
+        data = {
+            "id": profile.id,
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "method": scope["method"],
+            "path": scope["path"],
+            "route": _route_template(scope),
+            "query": scope.get("query_string", b"").decode(errors="replace"),
+            "path_params": {k: str(v) for k, v in (scope.get("path_params") or {}).items()},
+            "status": status_code,
+            "duration_ms": round(duration * 1000, 2),
+            "sql_ms": round(profile.sql_seconds * 1000, 2),
+            "sql_count": profile.sql_count,
+            "samples": profile.samples,
+            "sample_interval_ms": SAMPLE_INTERVAL * 1000,
+            "stacks": stacks,
+        }
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    with open(os.path.join(PROFILE_DIR, f"{profile.id}.json"), "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    _prune()
+
+
+def _profile_files() -> List[str]:
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    return sorted((name for name in os.listdir(PROFILE_DIR) if name.endswith(".json")), reverse=True)
+
+
+def _prune() -> None:
+    for name in _profile_files()[MAX_PROFILES:]:
+        try:
+            os.remove(os.path.join(PROFILE_DIR, name))
+        except FileNotFoundError:
+            pass
+
+
+def list_profiles(route: Optional[str] = None, limit: int = 50) -> List[Dict[str, Any]]:
+    """Newest first, without the stacks."""
+    found = []
+    for name in _profile_files():
+        try:
+            with open(os.path.join(PROFILE_DIR, name), encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if route and data.get("route") != route:
+            continue
+        data.pop("stacks", None)
+        found.append(data)
+        if len(found) >= limit:
+            break
+    return found
+
+
+def load_profile(profile_id: str) -> Optional[Dict[str, Any]]:
+    if os.path.basename(profile_id) != profile_id:
+        return None
+    path = os.path.join(PROFILE_DIR, f"{profile_id}.json")
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def folded(profile: Dict[str, Any]) -> str:
+    """Collapsed-stack text ("a;b;c 12" per line) for flamegraph.pl / speedscope."""
+    return "\n".join(f"{stack} {count}" for stack, count in sorted(profile["stacks"].items())) + "\n"
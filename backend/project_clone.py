@@ -0,0 +1,151 @@
+from datetime import datetime
+from typing import Dict, Any, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+import models
+
+# Project cloning / templating with set-based copies.
+# Phases, tasks, staffing and (optionally) task assignments are copied with one INSERT ... SELECT
+# per table inside a single transaction, so the number of round trips does not depend on the size
+# of the template. New rows take ordinary AUTO_INCREMENT ids, so concurrent inserts can't collide
+# with them. Each copy inserts in source id order, and ids handed out within one statement
+# increase in insertion order, so the n-th source row maps to the n-th new row: the old -> new
+# phase and task ids are paired by ROW_NUMBER() into temporary tables that the child copies join.
+
+
+def _shifted(column: str) -> str:
+    # Dates are stored as 'YYYY-MM-DD' strings; DATE_ADD on a string returns the same format
+    return f"DATE_ADD({column}, INTERVAL :shift_days DAY)"
+
+
+def _id_map(table: str, rows_of_project: str) -> str:
+    """CREATE of the temporary old -> new id map for `table`; rows_of_project selects a project's ids."""
+    return f"""
+        CREATE TEMPORARY TABLE clone_{table}_map (PRIMARY KEY (old_id))
+        SELECT o.id AS old_id, n.id AS new_id
+        FROM (SELECT x.id, ROW_NUMBER() OVER (ORDER BY x.id) AS rn FROM ({rows_of_project.format(project=":source_id")}) AS x) AS o
+        JOIN (SELECT x.id, ROW_NUMBER() OVER (ORDER BY x.id) AS rn FROM ({rows_of_project.format(project=":target_id")}) AS x) AS n
+          ON n.rn = o.rn
+    """
+
+
+_PHASE_IDS = "SELECT ph.id FROM project_phases ph WHERE ph.project_id = {project}"
+_TASK_IDS = "SELECT t.id FROM tasks t JOIN project_phases ph ON ph.id = t.phase_id WHERE ph.project_id = {project}"
+
+
+def _drop_id_maps(db: Session) -> None:
+    db.execute(text("DROP TEMPORARY TABLE IF EXISTS clone_project_phases_map"))
+    db.execute(text("DROP TEMPORARY TABLE IF EXISTS clone_tasks_map"))
+
+
+def clone_project(
+    db: Session,
+    source: models.Projects,
+    name: str,
+    client_name: Optional[str],
+    start_date: str,
+    include_staffing: bool = True,
+    include_assignments: bool = False,
+) -> Dict[str, Any]:
+    """
+    Copies `source` into a new project starting on `start_date`; every phase/task date is shifted
+    by the same number of days. Tasks come back as 'not started' with no spend, staffing with its
+    remaining forecast reset to the initial forecast. Time entries and invoices are never copied.
+    """
+    shift = datetime.fromisoformat(start_date).date() - datetime.fromisoformat(source.start_date).date()
+    shift_days = shift.days
+    end_date = None
+    if source.end_date:
+        end_date = (datetime.fromisoformat(source.end_date).date() + shift).isoformat()
+
+    try:
+        new_project = models.Projects(
+            name=name,
+            client_name=client_name if client_name is not None else source.client_name,
+            start_date=start_date,
+            end_date=end_date,
+            started=False,
+        )
+        db.add(new_project)
+        db.flush()
+
+        params = {
+            "source_id": source.id,
+            "target_id": new_project.id,
+            "shift_days": shift_days,
+        }
+        # Temporary tables live on the connection, so the maps are dropped on every path
+        _drop_id_maps(db)
+
+        phases = db.execute(text(f"""
+            INSERT INTO project_phases (project_id, phase_name, start_date, end_date)
+            SELECT
+              :target_id,
+              ph.phase_name,
+              {_shifted("ph.start_date")},
+              {_shifted("ph.end_date")}
+            FROM project_phases ph
+            WHERE ph.project_id = :source_id
+            ORDER BY ph.id
+        """), params).rowcount
+        db.execute(text(_id_map("project_phases", _PHASE_IDS)), params)
+
+        tasks = db.execute(text(f"""
+            INSERT INTO tasks
+              (phase_id, title, description, start_date, end_date, due_date, status, budget, actual_spend)
+            SELECT
+              pm.new_id,
+              t.title,
+              t.description,
+              {_shifted("t.start_date")},
+              {_shifted("t.end_date")},
+              {_shifted("t.due_date")},
+              'not started',
+              t.budget,
+              0
+            FROM tasks t
+            JOIN clone_project_phases_map pm ON pm.old_id = t.phase_id
+            ORDER BY t.id
+        """), params).rowcount
+        db.execute(text(_id_map("tasks", _TASK_IDS)), params)
+
+        staffing = 0
+        if include_staffing:
+            staffing = db.execute(text("""
+                INSERT INTO project_staffing
+                  (project_id, user_id, role_name, hourly_rate, forecast_hours_initial, forecast_hours_remaining)
+                SELECT
+                  :target_id, ps.user_id, ps.role_name, ps.hourly_rate,
+                  ps.forecast_hours_initial, ps.forecast_hours_initial
+                FROM project_staffing ps
+                WHERE ps.project_id = :source_id
+            """), params).rowcount
+
+        assignments = 0
+        if include_assignments:
+            assignments = db.execute(text("""
+                INSERT INTO task_assignments (task_id, user_id, hourly_rate)
+                SELECT tm.new_id, ta.user_id, ta.hourly_rate
+                FROM task_assignments ta
+                JOIN clone_tasks_map tm ON tm.old_id = ta.task_id
+            """), params).rowcount
+
+        _drop_id_maps(db)
+        db.commit()
+    except Exception:
+        db.rollback()
+        _drop_id_maps(db)
+        raise
+
+    return {
+        "project_id": params["target_id"],
+        "shift_days": shift_days,
+        "copied": {
+            "project_phases": phases,
+            "tasks": tasks,
+            "project_staffing": staffing,
+            "task_assignments": assignments,
+        },
+    }
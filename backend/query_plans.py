@@ -0,0 +1,318 @@
+"""
+Query plan regression check for the hand-written SQL (main.py, period_close.py, rate_history.py,
+burn.py, reconcile.py, changes.py).
+
+Runs every report/recompute/sync code path against the local (seeded) MySQL database and
+EXPLAINs each raw text() statement with the same parameters, right before it executes (so
+statements over reconcile's temporary tables are explained while those exist).
+--url checks another database instead. SQLite (EXPLAIN QUERY PLAN) is what archived projects are
+read from, and it runs the portable cases only; its planner ignores table sizes, so an empty
+in-memory database (--url sqlite://) is seeded with a small fixture. Each dialect has its own
+baseline file. Fails when:
+  - any statement reads time_entries or task_assignment_rates with a full table scan
+    (EXPLAIN type = ALL, SQLite "SCAN <table>" without an index; rate ranges are built from the scoped history rows only, except for
+    reconcile, which prices every entry and reads the whole history once: FULL_SCAN_ALLOWED),
+  - a statement's plan (select_type, table, access type, key) differs from the committed baseline, or
+  - there is no baseline to compare against.
+Row estimates are stored and reported, but only the plan shape is compared.
+
+Everything runs inside one transaction that is rolled back at the end, so nothing is written.
+Plans depend on table sizes, so use a database with realistic data (e.g. the DB backup).
+
+    python query_plans.py                   # check against query_plans.mysql.baseline.json
+    python query_plans.py --update-baseline # accept the current plans
+    python query_plans.py --url sqlite://   # the archive read path, against query_plans.sqlite.baseline.json
+"""
+import argparse
+import json
+import os
+import re
+import sys
+from typing import Dict, Any, List, Optional
+
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event, func
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+from sqlalchemy.sql.elements import TextClause
+
+import database
+import models
+
+# main (and reconcile) are imported once the database is chosen: main creates its tables on import
+
+# Cases whose SQL is MySQL-only (GREATEST, CREATE TEMPORARY TABLE ... SELECT, INNODB_TRX); they
+# never run against an archive
+MYSQL_ONLY_CASES = {"total_hours", "reconcile", "sync_changes"}
+
+
+def baseline_path(dialect: str) -> str:
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), f"query_plans.{dialect}.baseline.json")
+
+
+# Tables that must never be read with a full scan, and how they are aliased in the SQL
+GUARDED_TABLES = ("time_entries", "task_assignment_rates")
+_TABLE_ALIAS = {
+    table: re.compile(rf"\b{table}\b(?:\s+(?:AS\s+)?(\w+))?", re.IGNORECASE) for table in GUARDED_TABLES
+}
+# (case, table) pairs that read the whole table by design
+FULL_SCAN_ALLOWED = {("reconcile", "task_assignment_rates"), ("reconcile", "r")}
+_NOT_ALIASES = {"where", "join", "left", "inner", "on", "group", "order", "set", "using", "limit"}
+_EXPLAINABLE = ("SELECT", "INSERT", "UPDATE", "DELETE", "REPLACE", "WITH")
+_FIRST_SELECT = re.compile(r"\bSELECT\b", re.IGNORECASE)
+_SQLITE_FULL_SCAN = re.compile(r"^SCAN (?:TABLE )?(\w+)(?: AS (\w+))?(?: LEFT-JOIN)?$")
+
+
+def _sample_ids(db: Session) -> Optional[Dict[str, Any]]:
+    """The busiest project in the database, one of its tasks/users and its work-date range."""
+    row = (
+        db.query(
+            models.ProjectPhases.project_id,
+            func.count(models.TimeEntries.id),
+            func.min(models.TimeEntries.work_date),
+            func.max(models.TimeEntries.work_date),
+        )
+          .join(models.Tasks, models.Tasks.phase_id == models.ProjectPhases.id)
+          .join(models.TimeEntries, models.TimeEntries.task_id == models.Tasks.id)
+          .group_by(models.ProjectPhases.project_id)
+          .order_by(func.count(models.TimeEntries.id).desc())
+          .first()
+    )
+    if row is None:
+        return None
+    project_id, _, start, end = row
+    entry = (
+        db.query(models.TimeEntries.task_id, models.TimeEntries.user_id)
+          .join(models.Tasks, models.Tasks.id == models.TimeEntries.task_id)
+          .join(models.ProjectPhases, models.ProjectPhases.id == models.Tasks.phase_id)
+          .filter(models.ProjectPhases.project_id == project_id)
+          .first()
+    )
+    return {
+        "project_id": project_id,
+        "task_id": entry.task_id,
+        "user_id": entry.user_id,
+        "start": str(start)[:10],
+        "end": str(end)[:10],
+    }
+
+
+def _seed_fixture(db: Session) -> None:
+    """A minimal project for an empty SQLite database (the whole run is rolled back)."""
+    db.add_all([
+        models.Users(id=1, name="Plan Check"),
+        models.Projects(id=1, name="Plan check", client_name="Client", start_date="2024-01-01", end_date="2024-03-31"),
+        models.ProjectStaffing(project_id=1, user_id=1, role_name="Consultant", hourly_rate=100,
+                               forecast_hours_initial=40, forecast_hours_remaining=40),
+        models.ProjectPhases(id=1, project_id=1, phase_name="Phase", start_date="2024-01-01", end_date="2024-03-31"),
+        models.Tasks(id=1, phase_id=1, title="Task", start_date="2024-01-01", end_date="2024-03-31", budget=1000),
+        models.TaskAssignments(task_id=1, user_id=1, hourly_rate=100),
+        models.TaskAssignmentRates(task_id=1, user_id=1, hourly_rate=80, effective_from="0001-01-01"),
+        models.TaskAssignmentRates(task_id=1, user_id=1, hourly_rate=100, effective_from="2024-02-01"),
+        models.TimeEntries(task_id=1, user_id=1, work_date="2024-01-15", hours=4, is_billable=True),
+        models.TimeEntries(task_id=1, user_id=1, work_date="2024-02-15", hours=6, is_billable=True),
+    ])
+    db.flush()
+
+
+def _cases(client: TestClient, db: Session, ids: Dict[str, Any]):
+    import main
+    import reconcile
+
+    p, t, u = ids["project_id"], ids["task_id"], ids["user_id"]
+    period = {"start_date": ids["start"], "end_date": ids["end"]}
+    return {
+        "project_for_task": lambda: main.get_project_id_for_task(db, t),
+        "utilization": lambda: client.get(f"/projects/{p}/utilization", params={"start": ids["start"], "end": ids["end"]}),
+        "total_spend": lambda: client.get(f"/projects/{p}/total-spend/"),
+        "forecast_cost": lambda: client.get(f"/projects/{p}/forecast-cost/"),
+        "invoice_preview": lambda: client.get(
+            f"/projects/{p}/invoices/preview",
+            params={"period_start": ids["start"], "period_end": ids["end"]},
+        ),
+        "invoice_generate": lambda: client.post(
+            f"/projects/{p}/invoices/generate",
+            json={"period_start": ids["start"], "period_end": ids["end"]},
+        ),
+        "invoice_table": lambda: client.get(f"/projects/{p}/invoice-table/", params=period),
+        "project_tree": lambda: client.get(f"/projects/{p}/tree", params={"depth": 3}),
+        "timesheet": lambda: client.get(f"/users/{u}/timesheet", params={"start": ids["start"], "end": ids["end"]}),
+        "total_hours": lambda: main.recompute_staffing_hours(db, p, u),
+        "actual_spend": lambda: main.recompute_task_actual_spend(db, t),
+        "spend_series": lambda: client.get(f"/projects/{p}/spend-series/", params={"granularity": "day"}),
+        "reconcile": lambda: reconcile.reconcile(db, dry_run=False),
+        "sync_changes": lambda: client.get("/sync/changes", params={"since": 0, "limit": 500}),
+    }
+
+
+def _guarded_aliases(sql: str) -> set:
+    aliases = set(GUARDED_TABLES)
+    for pattern in _TABLE_ALIAS.values():
+        for alias in pattern.findall(sql):
+            if alias and alias.lower() not in _NOT_ALIASES:
+                aliases.add(alias)
+    return aliases
+
+
+def _explainable(statement: str) -> Optional[str]:
+    """The statement as EXPLAIN accepts it: CREATE TEMPORARY TABLE ... SELECT explains its SELECT."""
+    stripped = statement.lstrip()
+    if stripped.upper().startswith("CREATE TEMPORARY TABLE"):
+        match = _FIRST_SELECT.search(stripped)
+        return stripped[match.start():] if match else None
+    return stripped if stripped.upper().startswith(_EXPLAINABLE) else None
+
+
+def _explain(cursor, statement: str, parameters, dialect: str) -> Dict[str, Any]:
+    """Plan shape, row estimates and fully scanned tables/aliases of one statement."""
+    explain = cursor.connection.cursor()
+    try:
+        explain.execute(f"EXPLAIN QUERY PLAN {statement}" if dialect == "sqlite" else f"EXPLAIN {statement}", parameters)
+        names = [d[0] for d in explain.description]
+        rows = [dict(zip(names, row)) for row in explain.fetchall()]
+    finally:
+        explain.close()
+    if dialect == "sqlite":
+        details = [r["detail"] for r in rows]
+        scans = [_SQLITE_FULL_SCAN.match(d) for d in details]
+        return {
+            "plan": details,
+            "rows": [],  # SQLite doesn't estimate rows
+            "full_scans": sorted({m.group(2) or m.group(1) for m in scans if m}),
+        }
+    return {
+        "plan": [[r.get("select_type"), r.get("table"), r.get("type"), r.get("key")] for r in rows],
+        "rows": [r.get("rows") for r in rows],
+        "full_scans": sorted({r.get("table") for r in rows if r.get("type") == "ALL"}),
+    }
+
+
+def collect_plans(engine: Engine) -> Dict[str, Dict[str, Any]]:
+    import main
+
+    dialect = engine.dialect.name
+    conn = engine.connect()
+    outer = conn.begin()
+    db = Session(bind=conn, join_transaction_mode="create_savepoint")
+    captured: List[Dict[str, Any]] = []
+    current: Dict[str, Optional[str]] = {"case": None}
+
+    @event.listens_for(conn, "before_cursor_execute")
+    def capture(c, cursor, statement, parameters, context, executemany):
+        compiled = getattr(context, "compiled", None)
+        if current["case"] and compiled is not None and isinstance(compiled.statement, TextClause):
+            explainable = _explainable(statement)
+            if explainable is not None:
+                captured.append({
+                    "case": current["case"],
+                    "statement": statement,
+                    "explain": _explain(cursor, explainable, parameters, dialect),
+                })
+
+    def shared_session():
+        yield db
+
+    main.app.dependency_overrides[main.get_db] = shared_session
+    main.app.dependency_overrides[main.get_report_db] = shared_session
+    try:
+        ids = _sample_ids(db)
+        if ids is None and dialect == "sqlite":
+            _seed_fixture(db)
+            ids = _sample_ids(db)
+        if ids is None:
+            raise SystemExit("No time entries in the database; seed it before checking plans.")
+        client = TestClient(main.app)  # no startup hooks: no seeding, no index rebuilds
+        for name, run in _cases(client, db, ids).items():
+            if dialect != "mysql" and name in MYSQL_ONLY_CASES:
+                continue
+            current["case"] = name
+            response = run()
+            current["case"] = None
+            if getattr(response, "status_code", 200) >= 400:
+                raise SystemExit(f"{name}: HTTP {response.status_code} {response.text}")
+
+        event.remove(conn, "before_cursor_execute", capture)
+        plans: Dict[str, Dict[str, Any]] = {}
+        counters: Dict[str, int] = {}
+        for item in captured:
+            counters[item["case"]] = counters.get(item["case"], 0) + 1
+            key = f"{item['case']}#{counters[item['case']]}"
+            plans[key] = {
+                "sql": " ".join(item["statement"].split())[:160],
+                "plan": item["explain"]["plan"],
+                "rows": item["explain"]["rows"],
+                "_full_scans": item["explain"]["full_scans"],
+                "_guarded_aliases": sorted(_guarded_aliases(item["statement"])),
+            }
+        return plans
+    finally:
+        main.app.dependency_overrides.clear()
+        db.close()
+        outer.rollback()
+        conn.close()
+
+
+def check(plans: Dict[str, Dict[str, Any]], baseline: Optional[Dict[str, Dict[str, Any]]], path: str) -> List[str]:
+    failures = []
+    for key, info in plans.items():
+        case = key.split("#")[0]
+        for table in info["_full_scans"]:
+            if table in info["_guarded_aliases"] and (case, table) not in FULL_SCAN_ALLOWED:
+                failures.append(f"{key}: full table scan of {table}\n    {info['sql']}")
+
+    if baseline is None:
+        failures.append(f"no baseline at {path}; record one with --update-baseline")
+        return failures
+    for key in sorted(set(plans) | set(baseline)):
+        if key not in baseline:
+            failures.append(f"{key}: new statement, not in baseline (run with --update-baseline)")
+        elif key not in plans:
+            failures.append(f"{key}: in baseline but no longer executed")
+        elif plans[key]["plan"] != baseline[key]["plan"]:
+            failures.append(
+                f"{key}: plan changed\n    was: {baseline[key]['plan']}\n    now: {plans[key]['plan']}"
+            )
+        elif plans[key]["rows"] != baseline[key]["rows"]:
+            print(f"note: {key} row estimates {baseline[key]['rows']} -> {plans[key]['rows']}")
+    return failures
+
+
+def main_cli() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--update-baseline", action="store_true", help="write the current plans as the baseline")
+    parser.add_argument("--url", help="SQLAlchemy URL of the database to check (default: the app's MySQL database)")
+    args = parser.parse_args()
+
+    if args.url:
+        # Rebind the app before main is imported; SQLite is shared with the TestClient's threads
+        options = {"connect_args": {"check_same_thread": False}, "poolclass": StaticPool} if args.url.startswith("sqlite") else {}
+        database.engine = create_engine(args.url, future=True, **options)
+        database.SessionLocal.configure(bind=database.engine)
+    engine = database.engine
+    path = baseline_path(engine.dialect.name)
+
+    plans = collect_plans(engine)
+    print(f"explained {len(plans)} statements on {engine.dialect.name}")
+
+    if args.update_baseline:
+        stored = {key: {k: v for k, v in info.items() if not k.startswith("_")} for key, info in plans.items()}
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(stored, f, indent=2, default=str)
+            f.write("\n")
+        print(f"baseline written to {path}")
+
+    baseline = None
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    failures = check(plans, baseline, path)
+    for failure in failures:
+        print(f"FAIL {failure}")
+    print("OK" if not failures else f"{len(failures)} failure(s)")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
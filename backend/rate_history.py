@@ -0,0 +1,115 @@
+from datetime import date
+from typing import Dict, Any, List, Optional
+
+from sqlalchemy.orm import Session
+
+import models
+
+# Effective-dated assignment rates.
+# task_assignment_rates keeps every rate a (task, user) assignment has had, with the date it took
+# effect. Hours are priced at the rate in effect on their work_date instead of the current
+# task_assignments.hourly_rate, so editing a rate no longer reprices past hours.
+# The first history row of a pair is always effective from MIN_DATE, so every work_date resolves.
+# Pairs without any history (rates never edited since this was introduced) fall back to
+# task_assignments.hourly_rate.
+#
+# Reports resolve rates in SQL with a range join (rate_join()): each history row becomes a
+# half-open [effective_from, effective_to) range via LEAD(), and a time entry joins the single
+# range that contains its work_date. The ranges are built once per statement, set-based, and only
+# for the history rows the statement can use (the scope predicates below, served by the
+# (task_id, user_id, effective_from) index), so a single-task recompute never reads other tasks'
+# rates. Plain SQL, so it also runs on the SQLite sessions that serve archived projects.
+
+MIN_DATE = "0001-01-01"
+MAX_DATE = "9999-12-31"
+
+# Scopes for rate_join(): predicates on the history rows (alias r) a statement needs
+TASK_SCOPE = "r.task_id = :task_id"
+PROJECT_SCOPE = """r.task_id IN (
+    SELECT st.id FROM tasks st JOIN project_phases sph ON sph.id = st.phase_id
+    WHERE sph.project_id = :project_id)"""
+PROJECTS_SCOPE = """r.task_id IN (
+    SELECT st.id FROM tasks st JOIN project_phases sph ON sph.id = st.phase_id
+    WHERE sph.project_id IN :project_ids)"""
+ALL_SCOPE = "1 = 1"
+
+
+def rate_join(scope: str, te: str = "te", alias: str = "rr") -> str:
+    """LEFT JOIN of the rate range covering each time entry (`te` is the time_entries alias)."""
+    return f"""
+        LEFT JOIN (
+            SELECT
+              r.task_id,
+              r.user_id,
+              r.hourly_rate,
+              r.effective_from,
+              LEAD(r.effective_from, 1, '{MAX_DATE}')
+                OVER (PARTITION BY r.task_id, r.user_id ORDER BY r.effective_from) AS effective_to
+            FROM task_assignment_rates r
+            WHERE {scope}
+        ) AS {alias}
+          ON {alias}.task_id = {te}.task_id
+         AND {alias}.user_id = {te}.user_id
+         AND {te}.work_date >= {alias}.effective_from
+         AND {te}.work_date < {alias}.effective_to
+    """
+
+
+def rate_expr(ta: str = "ta", alias: str = "rr") -> str:
+    """The resolved rate: history when there is any, else the assignment's current rate."""
+    return f"COALESCE({alias}.hourly_rate, {ta}.hourly_rate, 0)"
+
+
+def parse_effective_from(value: Optional[str]) -> Optional[str]:
+    """Canonical YYYY-MM-DD (work_date is compared as a string), or ValueError."""
+    if value is None:
+        return None
+    return date.fromisoformat(value).isoformat()
+
+
+def record_rate(
+    db: Session,
+    task_id: int,
+    user_id: int,
+    new_rate: Optional[int],
+    old_rate: Optional[int],
+    effective_from: Optional[str] = None,
+) -> None:
+    """
+    Records a rate set on an assignment (old_rate is None for a new assignment).
+    Does not commit; call it inside the write that changes task_assignments.
+    """
+    if new_rate is None or new_rate == old_rate:
+        return
+    effective_from = effective_from or date.today().isoformat()
+
+    history = (
+        db.query(models.TaskAssignmentRates)
+          .filter(models.TaskAssignmentRates.task_id == task_id, models.TaskAssignmentRates.user_id == user_id)
+          .all()
+    )
+    if not history:
+        if old_rate is None:
+            effective_from = MIN_DATE  # a new assignment's first rate covers all of its hours
+        else:
+            # first edit of a pre-history assignment: keep its old rate for everything before
+            db.add(models.TaskAssignmentRates(task_id=task_id, user_id=user_id, hourly_rate=old_rate, effective_from=MIN_DATE))
+
+    same_day = next((h for h in history if h.effective_from == effective_from), None)
+    if same_day is not None:
+        same_day.hourly_rate = new_rate
+    else:
+        db.add(models.TaskAssignmentRates(task_id=task_id, user_id=user_id, hourly_rate=new_rate, effective_from=effective_from))
+
+
+def rate_history(db: Session, task_id: int) -> List[Dict[str, Any]]:
+    rows = (
+        db.query(models.TaskAssignmentRates)
+          .filter(models.TaskAssignmentRates.task_id == task_id)
+          .order_by(models.TaskAssignmentRates.user_id, models.TaskAssignmentRates.effective_from)
+          .all()
+    )
+    return [
+        {"user_id": r.user_id, "hourly_rate": r.hourly_rate, "effective_from": r.effective_from}
+        for r in rows
+    ]
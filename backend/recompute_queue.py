@@ -0,0 +1,111 @@
+import asyncio
+import threading
+import time
+from typing import Callable, Dict, Hashable, Optional, Tuple
+
+# Coalescing background queue for derived figures (task actual spend, staffing remaining hours).
+# A request for a key already waiting is absorbed, so a burst of saves on the same task or
+# (project, user) runs its recompute at most once per DEBOUNCE_SECONDS window, off the request path.
+# Keys are tuples whose first element names the handler, e.g. ("task_spend", task_id).
+
+DEBOUNCE_SECONDS = 0.5
+
+_lock = threading.Lock()
+_handlers: Dict[str, Callable[..., None]] = {}
+_pending: Dict[Tuple, Tuple[float, float]] = {}  # key -> (first requested at, due at)
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_wakeup: Optional[asyncio.Event] = None
+_worker: Optional[asyncio.Task] = None
+
+_metrics = {
+    "requested": 0,
+    "coalesced": 0,
+    "executed": 0,
+    "failed": 0,
+    "last_lag_seconds": 0.0,
+    "max_lag_seconds": 0.0,
+}
+
+
+def register(kind: str, handler: Callable[..., None]) -> None:
+    """handler(*key[1:]) runs in a worker thread and owns its own DB session."""
+    _handlers[kind] = handler
+
+
+def request(kind: str, *args: Hashable) -> None:
+    """Schedules a recompute. Safe to call from the event loop or from threadpool endpoints."""
+    key = (kind, *args)
+    now = time.monotonic()
+    with _lock:
+        _metrics["requested"] += 1
+        if key in _pending:
+            _metrics["coalesced"] += 1
+            return
+        _pending[key] = (now, now + DEBOUNCE_SECONDS)
+    if _loop is not None and _wakeup is not None:
+        _loop.call_soon_threadsafe(_wakeup.set)
+
+
+def metrics() -> Dict[str, float]:
+    now = time.monotonic()
+    with _lock:
+        oldest = min((requested for requested, _ in _pending.values()), default=None)
+        return {
+            **_metrics,
+            "depth": len(_pending),
+            "oldest_pending_seconds": round(now - oldest, 3) if oldest is not None else 0.0,
+        }
+
+
+async def _run() -> None:
+    while True:
+        _wakeup.clear()  # cleared before scanning so a request racing with the scan is never lost
+        now = time.monotonic()
+        with _lock:
+            due = [key for key, (_, due_at) in _pending.items() if due_at <= now]
+            ready = [(key, _pending.pop(key)[0]) for key in due]
+            next_due = min((due_at for _, due_at in _pending.values()), default=None)
+
+        for key, requested_at in ready:
+            handler = _handlers.get(key[0])
+            if handler is None:
+                continue
+            try:
+                await asyncio.to_thread(handler, *key[1:])
+                with _lock:
+                    _metrics["executed"] += 1
+            except Exception as exc:
+                print("Recompute failed:", key, exc)
+                with _lock:
+                    _metrics["failed"] += 1
+            lag = time.monotonic() - requested_at
+            with _lock:
+                _metrics["last_lag_seconds"] = round(lag, 3)
+                _metrics["max_lag_seconds"] = round(max(_metrics["max_lag_seconds"], lag), 3)
+
+        if ready:
+            continue  # new requests may have become due while we were running
+
+        timeout = max(next_due - time.monotonic(), 0) if next_due is not None else None
+        try:
+            await asyncio.wait_for(_wakeup.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+
+
+def start() -> None:
+    global _loop, _wakeup, _worker
+    _loop = asyncio.get_running_loop()
+    _wakeup = asyncio.Event()
+    _worker = _loop.create_task(_run())
+
+
+async def stop() -> None:
+    global _worker
+    if _worker is not None:
+        _worker.cancel()
+        try:
+            await _worker
+        except asyncio.CancelledError:
+            pass
+        _worker = None
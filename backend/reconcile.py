@@ -0,0 +1,192 @@
+import asyncio
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+import rate_history
+from database import SessionLocal
+
+# Portfolio-wide reconciliation of the derived figures:
+#   tasks.actual_spend                      = sum over assignments of hours logged * rate on work_date
+#   project_staffing.forecast_hours_remaining = max(forecast_hours_initial - hours logged, 0)
+# Same formulas as recompute_task_actual_spend / recompute_staffing_hours in main.py, but computed
+# for every row at once: each expected value is aggregated once into a temporary table, drifted
+# rows are reported from a join against it, and fixed with one UPDATE ... JOIN per table.
+# Runs nightly at RUN_AT_HOUR (local time) and on demand via POST /reconcile/.
+
+RUN_AT_HOUR = 2
+DRIFT_SAMPLE_LIMIT = 100
+
+_last_report: Optional[Dict[str, Any]] = None
+_worker: Optional[asyncio.Task] = None
+
+_EXPECTED_SPEND_SQL = f"""
+    CREATE TEMPORARY TABLE reconcile_task_spend (PRIMARY KEY (task_id))
+    SELECT t.id AS task_id, COALESCE(s.spend, 0) AS spend
+    FROM tasks t
+    LEFT JOIN (
+        SELECT ta.task_id AS task_id, SUM(COALESCE(te.hours, 0) * {rate_history.rate_expr()}) AS spend
+        FROM task_assignments ta
+        JOIN time_entries te ON te.task_id = ta.task_id AND te.user_id = ta.user_id
+        {rate_history.rate_join(rate_history.ALL_SCOPE)}
+        GROUP BY ta.task_id
+    ) AS s ON s.task_id = t.id
+"""
+
+_EXPECTED_REMAINING_SQL = """
+    CREATE TEMPORARY TABLE reconcile_staffing_remaining (PRIMARY KEY (staffing_id))
+    SELECT
+      ps.id AS staffing_id,
+      GREATEST(ps.forecast_hours_initial - COALESCE(h.hours, 0), 0) AS remaining
+    FROM project_staffing ps
+    LEFT JOIN (
+        SELECT ph.project_id, te.user_id, SUM(te.hours) AS hours
+        FROM time_entries te
+        JOIN tasks t ON t.id = te.task_id
+        JOIN project_phases ph ON ph.id = t.phase_id
+        GROUP BY ph.project_id, te.user_id
+    ) AS h ON h.project_id = ps.project_id AND h.user_id = ps.user_id
+"""
+
+_SPEND_DRIFT_SQL = """
+    SELECT t.id AS task_id, ph.project_id AS project_id, t.actual_spend AS stored, e.spend AS expected
+    FROM tasks t
+    JOIN reconcile_task_spend e ON e.task_id = t.id
+    LEFT JOIN project_phases ph ON ph.id = t.phase_id
+    WHERE NOT (t.actual_spend <=> e.spend)
+"""
+
+_REMAINING_DRIFT_SQL = """
+    SELECT
+      ps.id AS staffing_id, ps.project_id AS project_id, ps.user_id AS user_id,
+      ps.forecast_hours_remaining AS stored, e.remaining AS expected
+    FROM project_staffing ps
+    JOIN reconcile_staffing_remaining e ON e.staffing_id = ps.id
+    WHERE NOT (ps.forecast_hours_remaining <=> e.remaining)
+"""
+
+_FIX_SPEND_SQL = """
+    UPDATE tasks t
+    JOIN reconcile_task_spend e ON e.task_id = t.id
+    SET t.actual_spend = e.spend
+    WHERE NOT (t.actual_spend <=> e.spend)
+"""
+
+_FIX_REMAINING_SQL = """
+    UPDATE project_staffing ps
+    JOIN reconcile_staffing_remaining e ON e.staffing_id = ps.id
+    SET ps.forecast_hours_remaining = e.remaining
+    WHERE NOT (ps.forecast_hours_remaining <=> e.remaining)
+"""
+
+
+def _number(value) -> Optional[float]:
+    return float(value) if value is not None else None
+
+
+def _drift(rows, key: str, extra: List[str]) -> Dict[str, Any]:
+    sample = []
+    total_abs = 0.0
+    for r in rows:
+        stored, expected = _number(r.stored), _number(r.expected)
+        if stored is not None and expected is not None:
+            total_abs += abs(expected - stored)
+        if len(sample) < DRIFT_SAMPLE_LIMIT:
+            sample.append({key: getattr(r, key), "project_id": r.project_id,
+                           **{name: getattr(r, name) for name in extra},
+                           "stored": stored, "expected": expected})
+    return {"drifted": len(rows), "total_abs_drift": round(total_abs, 2), "sample": sample}
+
+
+def _drop_temp_tables(db: Session) -> None:
+    db.execute(text("DROP TEMPORARY TABLE IF EXISTS reconcile_task_spend"))
+    db.execute(text("DROP TEMPORARY TABLE IF EXISTS reconcile_staffing_remaining"))
+
+
+def reconcile(db: Session, dry_run: bool = False) -> Dict[str, Any]:
+    """Recomputes all task spend and staffing remaining hours; returns the drift report."""
+    started = time.perf_counter()
+    # Temporary tables live on the connection, so everything (including the drops) happens
+    # before the transaction ends and the session hands its connection back to the pool.
+    try:
+        _drop_temp_tables(db)
+        db.execute(text(_EXPECTED_SPEND_SQL))
+        db.execute(text(_EXPECTED_REMAINING_SQL))
+
+        spend_rows = db.execute(text(_SPEND_DRIFT_SQL)).fetchall()
+        remaining_rows = db.execute(text(_REMAINING_DRIFT_SQL)).fetchall()
+
+        fixed_spend = fixed_remaining = 0
+        if not dry_run:
+            fixed_spend = db.execute(text(_FIX_SPEND_SQL)).rowcount
+            fixed_remaining = db.execute(text(_FIX_REMAINING_SQL)).rowcount
+        _drop_temp_tables(db)
+    except Exception:
+        db.rollback()
+        raise
+    if dry_run:
+        db.rollback()
+    else:
+        db.commit()
+
+    return {
+        "ran_at": datetime.now().isoformat(timespec="seconds"),
+        "dry_run": dry_run,
+        "seconds": round(time.perf_counter() - started, 3),
+        "task_actual_spend": {**_drift(spend_rows, "task_id", []), "fixed": fixed_spend},
+        "staffing_forecast_hours_remaining": {**_drift(remaining_rows, "staffing_id", ["user_id"]), "fixed": fixed_remaining},
+    }
+
+
+def run_now(dry_run: bool = False) -> Dict[str, Any]:
+    global _last_report
+    db = SessionLocal()
+    try:
+        report = reconcile(db, dry_run=dry_run)
+    finally:
+        db.close()
+    if not dry_run:
+        _last_report = report
+    return report
+
+
+def last_report() -> Optional[Dict[str, Any]]:
+    return _last_report
+
+
+def _seconds_until_next_run() -> float:
+    now = datetime.now()
+    next_run = now.replace(hour=RUN_AT_HOUR, minute=0, second=0, microsecond=0)
+    if next_run <= now:
+        next_run += timedelta(days=1)
+    return (next_run - now).total_seconds()
+
+
+async def _nightly() -> None:
+    while True:
+        await asyncio.sleep(_seconds_until_next_run())
+        try:
+            report = await asyncio.to_thread(run_now)
+            print("Reconciliation:", report["task_actual_spend"]["drifted"], "task(s),",
+                  report["staffing_forecast_hours_remaining"]["drifted"], "staffing row(s) drifted")
+        except Exception as exc:
+            print("Reconciliation failed:", exc)
+
+
+def start() -> None:
+    global _worker
+    _worker = asyncio.get_running_loop().create_task(_nightly())
+
+
+async def stop() -> None:
+    global _worker
+    if _worker is not None:
+        _worker.cancel()
+        try:
+            await _worker
+        except asyncio.CancelledError:
+            pass
+        _worker = None
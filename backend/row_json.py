@@ -0,0 +1,47 @@
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from fastapi import Response
+from fastapi.responses import JSONResponse
+from sqlalchemy.orm import Query
+
+try:
+    import orjson
+except ImportError:  # falls back to the stdlib encoder
+    orjson = None
+
+# Fast path for list endpoints: select plain columns as row tuples and encode them straight to
+# JSON, instead of returning ORM instances that FastAPI walks with jsonable_encoder one by one.
+# The endpoints keep their declared response_model for the OpenAPI schema; returning a Response
+# directly skips FastAPI's per-row validation and encoding.
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        if orjson is not None:
+            return orjson.dumps(content)
+        return super().render(content)
+
+
+def column_query(query: Query, model) -> Query:
+    """Narrows an ORM query over `model` to its table columns (rows come back as tuples)."""
+    return query.with_entities(*model.__table__.columns)
+
+
+def rows_response(
+    rows: Iterable[Sequence[Any]],
+    keys: Sequence[str],
+    headers_from: Optional[Response] = None,
+) -> FastJSONResponse:
+    """JSON array of objects from row tuples. headers_from carries e.g. ETag/Cache-Control that
+    were set on the endpoint's injected Response (they are not merged into a returned Response)."""
+    keys = list(keys)
+    body: List[Dict[str, Any]] = [dict(zip(keys, row)) for row in rows]
+    headers = None
+    if headers_from is not None:
+        headers = {k: v for k, v in headers_from.headers.items() if k in ("etag", "cache-control")}
+    return FastJSONResponse(body, headers=headers)
+
+
+def model_rows_response(query: Query, model, headers_from: Optional[Response] = None) -> FastJSONResponse:
+    keys = [column.name for column in model.__table__.columns]
+    return rows_response(column_query(query, model).all(), keys, headers_from)
@@ -0,0 +1,181 @@
+from datetime import date, datetime, timedelta
+from typing import List, Dict, Any, Optional
+
+import numpy as np
+from sqlalchemy import text, bindparam
+from sqlalchemy.orm import Session
+
+import models
+from utils import monday_of
+import rate_history
+
+
+def load_portfolio(db: Session, project_ids: List[int]) -> Dict[str, Any]:
+    """
+    Loads staffing, rates and actuals for the given projects into flat NumPy arrays
+    (one element per project_staffing row). Nothing is written back to the database.
+    """
+    projects = db.query(models.Projects).filter(models.Projects.id.in_(project_ids)).all()
+    spans: Dict[int, tuple] = {}
+    for p in projects:
+        try:
+            spans[p.id] = (
+                datetime.fromisoformat(str(p.start_date)).date(),
+                datetime.fromisoformat(str(p.end_date)).date(),
+            )
+        except Exception:
+            continue  # projects without usable dates cannot be projected
+
+    staffing = (
+        db.query(models.ProjectStaffing)
+          .filter(models.ProjectStaffing.project_id.in_(list(spans.keys())))
+          .order_by(models.ProjectStaffing.project_id, models.ProjectStaffing.user_id)
+          .all()
+    )
+
+    # Actual hours and cost per (project, user), priced the same way as get_total_project_spend
+    actuals_sql = text(f"""
+        SELECT
+          ph.project_id                                               AS project_id,
+          te.user_id                                                  AS user_id,
+          SUM(COALESCE(te.hours, 0))                                  AS actual_hours,
+          SUM(COALESCE(te.hours, 0) * {rate_history.rate_expr()})     AS actual_cost
+        FROM time_entries AS te
+        JOIN tasks AS t ON te.task_id = t.id
+        JOIN task_assignments AS ta ON ta.task_id = t.id AND ta.user_id = te.user_id
+        JOIN project_phases AS ph ON t.phase_id = ph.id
+        {rate_history.rate_join(rate_history.PROJECTS_SCOPE)}
+        WHERE ph.project_id IN :project_ids
+        GROUP BY ph.project_id, te.user_id
+    """).bindparams(bindparam("project_ids", expanding=True))
+    actual_map: Dict[tuple, tuple] = {}
+    if spans:
+        for r in db.execute(actuals_sql, {"project_ids": list(spans.keys())}).fetchall():
+            actual_map[(int(r.project_id), int(r.user_id))] = (
+                float(r.actual_hours or 0.0),
+                float(r.actual_cost or 0.0),
+            )
+
+    n = len(staffing)
+    arrays = {
+        "project_id": np.zeros(n, dtype=np.int64),
+        "user_id": np.zeros(n, dtype=np.int64),
+        "hourly_rate": np.zeros(n, dtype=np.float64),
+        "forecast_hours_initial": np.zeros(n, dtype=np.float64),
+        "forecast_hours_remaining": np.zeros(n, dtype=np.float64),
+        "actual_hours": np.zeros(n, dtype=np.float64),
+        "actual_cost": np.zeros(n, dtype=np.float64),
+    }
+    for i, ps in enumerate(staffing):
+        arrays["project_id"][i] = ps.project_id
+        arrays["user_id"][i] = ps.user_id
+        arrays["hourly_rate"][i] = float(ps.hourly_rate or 0)
+        arrays["forecast_hours_initial"][i] = float(ps.forecast_hours_initial or 0)
+        arrays["forecast_hours_remaining"][i] = float(ps.forecast_hours_remaining or 0)
+        hours, cost = actual_map.get((ps.project_id, ps.user_id), (0.0, 0.0))
+        arrays["actual_hours"][i] = hours
+        arrays["actual_cost"][i] = cost
+
+    arrays["spans"] = spans
+    return arrays
+
+
+def run_scenarios(
+    portfolio: Dict[str, Any],
+    scenarios: List[Dict[str, Any]],
+    as_of: Optional[date] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Evaluates every scenario at once over the loaded portfolio.
+
+    Each scenario is {"name": str, "overrides": [{"user_id", "project_id"?, "hourly_rate"?, "allocation_pct"?}]}.
+    - hourly_rate replaces the staffed rate for the remaining hours.
+    - allocation_pct scales the user's remaining forecast hours (100 = unchanged).
+    A "baseline" scenario with no overrides is always evaluated first.
+
+    Remaining hours are burned uniformly over the remaining weeks of each project,
+    matching the even spread assumption used by get_project_utilization.
+    """
+    as_of = as_of or date.today()
+    spans: Dict[int, tuple] = portfolio["spans"]
+    project_ids = np.array(sorted(spans.keys()), dtype=np.int64)
+
+    pid = portfolio["project_id"]
+    uid = portfolio["user_id"]
+    base_rate = portfolio["hourly_rate"]
+    remaining = portfolio["forecast_hours_remaining"]
+    actual_cost = portfolio["actual_cost"]
+
+    all_scenarios = [{"name": "baseline", "overrides": []}] + list(scenarios)
+    S, n, P = len(all_scenarios), len(pid), len(project_ids)
+
+    # Scenario matrices (S x n): start from the stored values and apply overrides per row.
+    rate = np.tile(base_rate, (S, 1))
+    alloc = np.ones((S, n), dtype=np.float64)
+    for s, scenario in enumerate(all_scenarios):
+        for ov in scenario.get("overrides", []):
+            mask = uid == int(ov["user_id"])
+            if ov.get("project_id") is not None:
+                mask &= pid == int(ov["project_id"])
+            if ov.get("hourly_rate") is not None:
+                rate[s, mask] = float(ov["hourly_rate"])
+            if ov.get("allocation_pct") is not None:
+                alloc[s, mask] = float(ov["allocation_pct"]) / 100.0
+
+    # Row -> project column index, and a one-hot (n x P) to sum rows per project in one matmul.
+    col = np.searchsorted(project_ids, pid)
+    onehot = np.zeros((n, P), dtype=np.float64)
+    onehot[np.arange(n), col] = 1.0
+
+    # Forecast cost is scenario independent (same as get_total_forecast_cost).
+    forecast_cost = (base_rate * portfolio["forecast_hours_initial"]) @ onehot      # (P,)
+    actual_by_project = actual_cost @ onehot                                         # (P,)
+
+    remaining_hours = remaining[None, :] * alloc                                     # (S, n)
+    remaining_cost = rate * remaining_hours                                          # (S, n)
+    projected_cost = actual_by_project[None, :] + remaining_cost @ onehot            # (S, P)
+    variance = projected_cost - forecast_cost[None, :]
+
+    # Weekly axis shared by every project: from the current week to the last project end.
+    w0 = monday_of(as_of)
+    last_end = max((monday_of(end) for _, end in spans.values()), default=w0)
+    num_weeks = max(((last_end - w0).days // 7) + 1, 1)
+    weeks = [w0 + timedelta(days=7 * k) for k in range(num_weeks)]
+
+    # Weeks of burn left per project (at least 1, so overdue projects burn in the current week).
+    burn_start = np.array([max((monday_of(spans[p][0]) - w0).days // 7, 0) for p in project_ids], dtype=np.int64)
+    burn_end = np.array([max((monday_of(spans[p][1]) - w0).days // 7, 0) for p in project_ids], dtype=np.int64)
+    burn_weeks = np.maximum(burn_end - burn_start + 1, 1)
+
+    # Fraction of remaining cost still unspent at the end of week k for each project (P x W).
+    k = np.arange(num_weeks)[None, :]
+    elapsed = np.clip(k - burn_start[:, None] + 1, 0, burn_weeks[:, None])
+    left_fraction = 1.0 - elapsed / burn_weeks[:, None]
+
+    remaining_by_project = remaining_cost @ onehot                                   # (S, P)
+    remaining_curve = remaining_by_project[:, :, None] * left_fraction[None, :, :]   # (S, P, W)
+    cumulative_curve = projected_cost[:, :, None] - remaining_curve                   # (S, P, W)
+
+    results: List[Dict[str, Any]] = []
+    for s, scenario in enumerate(all_scenarios):
+        projects_out = []
+        for j, project_id in enumerate(project_ids):
+            fc = float(forecast_cost[j])
+            projects_out.append({
+                "project_id": int(project_id),
+                "forecast_cost": round(fc, 2),
+                "actual_cost": round(float(actual_by_project[j]), 2),
+                "projected_cost": round(float(projected_cost[s, j]), 2),
+                "variance": round(float(variance[s, j]), 2),
+                "variance_pct": (round(float(variance[s, j]) / fc, 4) if fc > 0 else None),
+                "burn_down": [
+                    {
+                        "week_start": weeks[w].isoformat(),
+                        "remaining_cost": round(float(remaining_curve[s, j, w]), 2),
+                        "cumulative_cost": round(float(cumulative_curve[s, j, w]), 2),
+                    }
+                    for w in range(num_weeks)
+                ],
+            })
+        results.append({"name": scenario.get("name") or f"scenario_{s}", "projects": projects_out})
+    return results
@@ -0,0 +1,185 @@
+import bisect
+import math
+import re
+import threading
+from typing import Dict, Any, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+import models
+
+# In-memory inverted index over Projects.name / client_name and Tasks.title / description.
+# Built once at startup, then updated incrementally from the write paths.
+# The last query term is matched as a prefix (search-as-you-type) using a sorted token list.
+
+FIELD_WEIGHTS = {
+    "name": 3.0,         # project name
+    "client_name": 2.0,  # project client
+    "title": 2.0,        # task title
+    "description": 1.0,  # task description
+}
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+DocKey = Tuple[str, int]  # ("project" | "task", id)
+
+_lock = threading.RLock()
+_postings: Dict[str, Dict[DocKey, float]] = {}  # token -> {doc: weighted term frequency}
+_sorted_tokens: List[str] = []
+_docs: Dict[DocKey, Dict[str, Any]] = {}        # doc -> display fields + its tokens
+_ready = False
+
+
+def tokenize(value: Optional[str]) -> List[str]:
+    return _TOKEN_RE.findall((value or "").lower())
+
+
+def _remove(key: DocKey) -> None:
+    doc = _docs.pop(key, None)
+    if doc is None:
+        return
+    for token in doc["_tokens"]:
+        postings = _postings.get(token)
+        if postings is None:
+            continue
+        postings.pop(key, None)
+        if not postings:
+            del _postings[token]
+            i = bisect.bisect_left(_sorted_tokens, token)
+            if i < len(_sorted_tokens) and _sorted_tokens[i] == token:
+                _sorted_tokens.pop(i)
+
+
+def _add(key: DocKey, fields: Dict[str, Optional[str]], display: Dict[str, Any]) -> None:
+    _remove(key)
+    weights: Dict[str, float] = {}
+    for field, value in fields.items():
+        for token in tokenize(value):
+            weights[token] = weights.get(token, 0.0) + FIELD_WEIGHTS[field]
+    for token, weight in weights.items():
+        postings = _postings.get(token)
+        if postings is None:
+            postings = _postings[token] = {}
+            bisect.insort(_sorted_tokens, token)
+        postings[key] = weight
+    _docs[key] = {**display, "_tokens": list(weights.keys())}
+
+
+def index_project(project: models.Projects) -> None:
+    with _lock:
+        _add(
+            ("project", project.id),
+            {"name": project.name, "client_name": project.client_name},
+            {"type": "project", "id": project.id, "name": project.name, "client_name": project.client_name},
+        )
+
+
+def index_task(task: models.Tasks, project_id: Optional[int]) -> None:
+    with _lock:
+        _add(
+            ("task", task.id),
+            {"title": task.title, "description": task.description},
+            {
+                "type": "task",
+                "id": task.id,
+                "title": task.title,
+                "description": task.description,
+                "phase_id": task.phase_id,
+                "project_id": project_id,
+                "status": task.status,
+            },
+        )
+
+
+def remove_project(project_id: int) -> None:
+    """Drops a project and all of its tasks from the index."""
+    with _lock:
+        _remove(("project", project_id))
+        task_keys = [key for key, doc in _docs.items() if key[0] == "task" and doc.get("project_id") == project_id]
+        for key in task_keys:
+            _remove(key)
+
+
+def index_project_subtree(db: Session, project_id: int) -> None:
+    project = db.query(models.Projects).filter(models.Projects.id == project_id).first()
+    if project:
+        index_project(project)
+    tasks = (
+        db.query(models.Tasks)
+          .join(models.ProjectPhases, models.ProjectPhases.id == models.Tasks.phase_id)
+          .filter(models.ProjectPhases.project_id == project_id)
+          .all()
+    )
+    for task in tasks:
+        index_task(task, project_id)
+
+
+def rebuild(db: Session) -> None:
+    global _ready
+    with _lock:
+        _postings.clear()
+        _sorted_tokens.clear()
+        _docs.clear()
+        for project in db.query(models.Projects).all():
+            index_project(project)
+        rows = (
+            db.query(models.Tasks, models.ProjectPhases.project_id)
+              .outerjoin(models.ProjectPhases, models.ProjectPhases.id == models.Tasks.phase_id)
+              .all()
+        )
+        for task, project_id in rows:
+            index_task(task, project_id)
+        _ready = True
+
+
+def is_ready() -> bool:
+    return _ready
+
+
+def _expand(term: str, prefix: bool) -> List[str]:
+    if not prefix:
+        return [term] if term in _postings else []
+    i = bisect.bisect_left(_sorted_tokens, term)
+    matches = []
+    while i < len(_sorted_tokens) and _sorted_tokens[i].startswith(term):
+        matches.append(_sorted_tokens[i])
+        i += 1
+    return matches
+
+
+def search(query: str, doc_type: Optional[str] = None, limit: int = 20, offset: int = 0) -> Dict[str, Any]:
+    """
+    Ranked AND search: every query term must match (the last one as a prefix).
+    Score is the sum over matched tokens of field-weighted tf * idf.
+    """
+    terms = tokenize(query)
+    if not terms:
+        return {"total": 0, "results": []}
+
+    with _lock:
+        num_docs = max(len(_docs), 1)
+        scores: Optional[Dict[DocKey, float]] = None
+        for position, term in enumerate(terms):
+            term_scores: Dict[DocKey, float] = {}
+            for token in _expand(term, prefix=(position == len(terms) - 1)):
+                postings = _postings[token]
+                idf = math.log(1 + num_docs / len(postings))
+                for key, weight in postings.items():
+                    if doc_type and key[0] != doc_type:
+                        continue
+                    term_scores[key] = max(term_scores.get(key, 0.0), weight * idf)
+            if scores is None:
+                scores = term_scores
+            else:
+                scores = {key: score + term_scores[key] for key, score in scores.items() if key in term_scores}
+            if not scores:
+                break
+
+        ranked = sorted((scores or {}).items(), key=lambda item: (-item[1], item[0]))
+        page = ranked[offset:offset + limit]
+        results = []
+        for key, score in page:
+            doc = {k: v for k, v in _docs[key].items() if k != "_tokens"}
+            doc["score"] = round(score, 4)
+            results.append(doc)
+    return {"total": len(ranked), "results": results}
@@ -0,0 +1,219 @@
+import bisect
+import threading
+from datetime import date, datetime
+from typing import Dict, Any, List, Optional, Tuple, Set
+
+from sqlalchemy.orm import Session
+
+import models
+
+# In-memory timeline index over project phases and tasks.
+#
+# IntervalIndex keeps intervals sorted by start with a max-end segment tree on top, so an
+# overlap query [a, b] is a bisect on starts plus a pruned tree walk: O(log n + k log n).
+# Writes go to a small unsorted delta (and tombstones for removed entries) which queries
+# scan linearly; once the delta grows past REBUILD_THRESHOLD the sorted part is rebuilt.
+# Due dates are points, kept in a plain sorted list for range (stabbing) queries.
+
+REBUILD_THRESHOLD = 256
+
+Key = Tuple[str, int]  # ("phase" | "task", id)
+
+
+def to_ordinal(value: Optional[str]) -> Optional[int]:
+    try:
+        return datetime.fromisoformat(str(value)).date().toordinal()
+    except Exception:
+        return None
+
+
+class IntervalIndex:
+    def __init__(self) -> None:
+        self.items: Dict[Key, Tuple[int, int]] = {}
+        self._keys: List[Key] = []
+        self._los: List[int] = []
+        self._his: List[int] = []
+        self._tree: List[int] = []
+        self._size = 1
+        self._delta: Dict[Key, Tuple[int, int]] = {}
+        self._tombstones: Set[Key] = set()
+
+    def _rebuild(self) -> None:
+        ordered = sorted(self.items.items(), key=lambda item: item[1][0])
+        self._keys = [key for key, _ in ordered]
+        self._los = [lo for _, (lo, _) in ordered]
+        self._his = [hi for _, (_, hi) in ordered]
+        self._size = 1
+        while self._size < len(self._his):
+            self._size *= 2
+        tree = [-1] * (2 * self._size)
+        tree[self._size:self._size + len(self._his)] = self._his
+        for i in range(self._size - 1, 0, -1):
+            tree[i] = max(tree[2 * i], tree[2 * i + 1])
+        self._tree = tree
+        self._delta.clear()
+        self._tombstones.clear()
+
+    def _maybe_rebuild(self) -> None:
+        if len(self._delta) + len(self._tombstones) > REBUILD_THRESHOLD:
+            self._rebuild()
+
+    def add(self, key: Key, lo: int, hi: int) -> None:
+        if key in self.items:
+            self.remove(key)
+        self.items[key] = (lo, hi)
+        self._delta[key] = (lo, hi)
+        self._maybe_rebuild()
+
+    def remove(self, key: Key) -> None:
+        if self.items.pop(key, None) is None:
+            return
+        if self._delta.pop(key, None) is None:
+            self._tombstones.add(key)  # lives in the sorted part
+        self._maybe_rebuild()
+
+    def overlapping(self, a: int, b: int) -> List[Key]:
+        """Keys whose [lo, hi] overlaps [a, b]. A stabbing query is a == b."""
+        found: List[Key] = []
+        limit = bisect.bisect_right(self._los, b)  # only intervals starting on/before b
+        if limit:
+            self._collect(limit, a, found)
+        for key, (lo, hi) in self._delta.items():
+            if lo <= b and hi >= a:
+                found.append(key)
+        return found
+
+    def _collect(self, limit: int, a: int, found: List[Key]) -> None:
+        # Iterative walk of the max-end tree over positions [0, limit), pruning ends < a.
+        stack = [(1, 0, self._size)]
+        while stack:
+            node, node_lo, node_hi = stack.pop()
+            if node_lo >= limit or self._tree[node] < a:
+                continue
+            if node_hi - node_lo == 1:
+                key = self._keys[node_lo]
+                if key not in self._tombstones:
+                    found.append(key)
+                continue
+            mid = (node_lo + node_hi) // 2
+            stack.append((2 * node + 1, mid, node_hi))
+            stack.append((2 * node, node_lo, mid))
+
+
+class TimelineIndex:
+    def __init__(self) -> None:
+        self.lock = threading.RLock()
+        self.intervals = IntervalIndex()
+        self.due: List[Tuple[int, int]] = []          # sorted (due ordinal, task id)
+        self.docs: Dict[Key, Dict[str, Any]] = {}
+        self.by_project: Dict[int, Set[Key]] = {}
+        self.ready = False
+
+    def _remove(self, key: Key) -> None:
+        doc = self.docs.pop(key, None)
+        if doc is None:
+            return
+        self.intervals.remove(key)
+        if key[0] == "task" and doc.get("_due") is not None:
+            entry = (doc["_due"], key[1])
+            i = bisect.bisect_left(self.due, entry)
+            if i < len(self.due) and self.due[i] == entry:
+                self.due.pop(i)
+        project_keys = self.by_project.get(doc.get("project_id"))
+        if project_keys is not None:
+            project_keys.discard(key)
+
+    def _add(self, key: Key, doc: Dict[str, Any], lo: Optional[int], hi: Optional[int], due: Optional[int]) -> None:
+        self._remove(key)
+        doc["_due"] = due
+        self.docs[key] = doc
+        self.by_project.setdefault(doc.get("project_id"), set()).add(key)
+        if lo is not None or hi is not None:
+            lo = lo if lo is not None else hi
+            hi = hi if hi is not None else lo
+            self.intervals.add(key, min(lo, hi), max(lo, hi))
+        if due is not None:
+            bisect.insort(self.due, (due, key[1]))
+
+    def add_phase(self, phase: models.ProjectPhases) -> None:
+        with self.lock:
+            self._add(("phase", phase.id), {
+                "type": "phase",
+                "id": phase.id,
+                "project_id": phase.project_id,
+                "phase_name": phase.phase_name,
+                "start_date": phase.start_date,
+                "end_date": phase.end_date,
+            }, to_ordinal(phase.start_date), to_ordinal(phase.end_date), None)
+
+    def add_task(self, task: models.Tasks, project_id: Optional[int]) -> None:
+        with self.lock:
+            self._add(("task", task.id), {
+                "type": "task",
+                "id": task.id,
+                "project_id": project_id,
+                "phase_id": task.phase_id,
+                "title": task.title,
+                "status": task.status,
+                "start_date": task.start_date,
+                "end_date": task.end_date,
+                "due_date": task.due_date,
+            }, to_ordinal(task.start_date), to_ordinal(task.end_date), to_ordinal(task.due_date))
+
+    def remove_project(self, project_id: int) -> None:
+        with self.lock:
+            for key in list(self.by_project.get(project_id, ())):
+                self._remove(key)
+            self.by_project.pop(project_id, None)
+
+    def refresh_project(self, db: Session, project_id: int) -> None:
+        """Re-reads one project's phases and tasks (two queries) into the index."""
+        phases = db.query(models.ProjectPhases).filter(models.ProjectPhases.project_id == project_id).all()
+        tasks = (
+            db.query(models.Tasks)
+              .join(models.ProjectPhases, models.ProjectPhases.id == models.Tasks.phase_id)
+              .filter(models.ProjectPhases.project_id == project_id)
+              .all()
+        )
+        with self.lock:
+            self.remove_project(project_id)
+            for phase in phases:
+                self.add_phase(phase)
+            for task in tasks:
+                self.add_task(task, project_id)
+
+    def rebuild(self, db: Session) -> None:
+        phases = db.query(models.ProjectPhases).all()
+        tasks = (
+            db.query(models.Tasks, models.ProjectPhases.project_id)
+              .outerjoin(models.ProjectPhases, models.ProjectPhases.id == models.Tasks.phase_id)
+              .all()
+        )
+        with self.lock:
+            self.intervals = IntervalIndex()
+            self.due = []
+            self.docs = {}
+            self.by_project = {}
+            for phase in phases:
+                self.add_phase(phase)
+            for task, project_id in tasks:
+                self.add_task(task, project_id)
+            self.intervals._rebuild()
+            self.ready = True
+
+    def _public(self, key: Key) -> Dict[str, Any]:
+        return {k: v for k, v in self.docs[key].items() if not k.startswith("_")}
+
+    def active(self, start: date, end: date) -> List[Dict[str, Any]]:
+        with self.lock:
+            keys = self.intervals.overlapping(start.toordinal(), end.toordinal())
+            return [self._public(key) for key in keys]
+
+    def due_between(self, start: date, end: date) -> List[Dict[str, Any]]:
+        with self.lock:
+            lo = bisect.bisect_left(self.due, (start.toordinal(), -1))
+            hi = bisect.bisect_right(self.due, (end.toordinal(), float("inf")))
+            return [self._public(("task", task_id)) for _, task_id in self.due[lo:hi]]
+
+
+timeline = TimelineIndex()
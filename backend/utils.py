@@ -0,0 +1,6 @@
+from datetime import date, timedelta
+
+
+# --- helper: week start (Monday) ---
+def monday_of(d: date) -> date:
+    return d - timedelta(days=d.weekday())
@@ -0,0 +1,49 @@
+import hashlib
+from typing import Optional
+
+from fastapi import Request
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+import archive
+
+# Per-project versions used to build strong ETags for project-scoped reads.
+# Versions come from the database, so every worker process agrees on them and every write path
+# (ORM, raw SQL, other processes) moves them: the change_log triggers (changes.py) stamp each
+# entry with its row's project, and a project's version is the count and id sum of its entries
+# plus the users entries (project 0). A change REPLACEs its row's entry with a new id, so the sum
+# moves on every committed change, even one whose id is lower than ids already visible.
+# One index-only range scan of (project_id, id), far cheaper than the reads it guards.
+# Archived projects are served from their Parquet export, which can't change while archived;
+# elsewhere without the triggers (non-MySQL databases) there is no version and no ETag.
+
+_VERSION_SQL = text("""
+    SELECT COUNT(*) AS entries, COALESCE(SUM(id), 0) AS id_sum
+    FROM change_log
+    WHERE project_id IN (:project_id, 0)
+""")
+
+
+def project_version(db: Session, project_id: int) -> Optional[str]:
+    if db.get_bind().dialect.name != "mysql":
+        manifest = archive.read_manifest(project_id)
+        return f"a{manifest['archived_at']}" if manifest else None
+    row = db.execute(_VERSION_SQL, {"project_id": project_id}).fetchone()
+    return f"{row.entries}.{row.id_sum}"
+
+
+def etag_for(request: Request, project_id: int, version: str) -> str:
+    """Strong ETag for this route + query string at the project's current version."""
+    resource = f"{request.url.path}?{request.url.query}"
+    digest = hashlib.blake2b(f"{resource}|{version}".encode(), digest_size=8).hexdigest()
+    return f'"{project_id}-{digest}"'
+
+
+def not_modified(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return etag in candidates or f"W/{etag}" in candidates